@@ -0,0 +1,276 @@
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from bitboard import KNIGHT_OFFSETS, KING_OFFSETS, ROOK_DIRECTIONS, BISHOP_DIRECTIONS
+from board import Board
+from codec import POSITION_SIZE, BLACK_TO_MOVE, encode
+from evaluation import MG_VALUES, EG_VALUES, MG_TABLE, EG_TABLE, PHASE_TABLE, MAX_PHASE
+from pieces import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+
+# Vectorised evaluation of many positions at once, for offline analysis of
+# stored games. Positions come in as packed codec.encode records (41 bytes
+# each, so a file of them can be memory-mapped) and every feature is computed
+# for a whole chunk with array operations instead of per-square Python loops.
+
+# One codec.encode record: 64 hex nibble piece codes, has_moved mask, flags
+RECORD = np.dtype([('squares', 'u1', 32), ('moved', '<u8'), ('flags', 'u1')])
+assert RECORD.itemsize == POSITION_SIZE
+
+_ALL = np.uint64(2 ** 64 - 1)
+
+
+def _pack_score(mg, eg):
+    # Middlegame and endgame terms summed in one int64, as mg * 2**32 + eg
+    return mg * 2 ** 32 + eg
+
+
+def _unpack_score(score):
+    eg = ((score + 2 ** 31) & (2 ** 32 - 1)) - 2 ** 31
+    return (score - eg) >> 32, eg
+
+
+def _pair_table():
+    # Packed piece-square score of one record byte (two squares), indexed by
+    # byte offset * 256 + byte value; bytes holding digits above 12 never occur
+    table = np.zeros(32 * 256, dtype=np.int64)
+    for offset in range(32):
+        for value in range(256):
+            mg = eg = 0
+            for digit, square in ((value >> 4, offset * 2), (value & 15, offset * 2 + 1)):
+                if 0 < digit <= 12:
+                    mg += MG_TABLE[digit - 1][square]
+                    eg += EG_TABLE[digit - 1][square]
+            table[offset * 256 + value] = _pack_score(mg, eg)
+    return table
+
+
+_PAIR_SCORES = _pair_table()
+_PAIR_OFFSETS = np.arange(32) * 256
+# Per piece code weights for the (N, 12) piece counts
+_MATERIAL = _pack_score(np.array(MG_VALUES + tuple(-value for value in MG_VALUES), dtype=np.int64),
+                        np.array(EG_VALUES + tuple(-value for value in EG_VALUES), dtype=np.int64))
+_PHASE = np.array(PHASE_TABLE, dtype=np.int64)
+
+_COLUMN = [np.uint64(sum(1 << (row * 8 + col) for row in range(8))) for col in range(8)]
+# Squares a one-step shift may land on without wrapping round the board edge, by column change
+_LANDING = {
+    0: _ALL,
+    1: ~_COLUMN[0],
+    2: ~(_COLUMN[0] | _COLUMN[1]),
+    -1: ~_COLUMN[7],
+    -2: ~(_COLUMN[6] | _COLUMN[7]),
+}
+
+_POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+
+def popcount(bitboards):
+    # Set bits per uint64; the byte table covers NumPy before bitwise_count
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bitboards).astype(np.int64)
+    data = np.ascontiguousarray(bitboards, dtype=np.uint64)
+    return _POPCOUNT[data.view(np.uint8)].reshape(data.shape + (8,)).sum(axis=-1, dtype=np.int64)
+
+
+def _shift(bitboards, d_row, d_col, steps=1):
+    # Moves every set bit steps squares in direction (d_row, d_col), unmasked
+    amount = (d_row * 8 + d_col) * steps
+    if amount > 0:
+        return bitboards << np.uint64(amount)
+    return bitboards >> np.uint64(-amount)
+
+
+def _step(bitboards, d_row, d_col):
+    return _shift(bitboards, d_row, d_col) & _LANDING[d_col]
+
+
+def _leaps(bitboards, offsets):
+    attacks = np.zeros_like(bitboards)
+    for d_row, d_col in offsets:
+        attacks |= _step(bitboards, d_row, d_col)
+    return attacks
+
+
+def _slides(sliders, empty, directions):
+    # Kogge-Stone occluded fill: the squares every slider reaches along the
+    # given directions, blockers included, for all positions at once
+    attacks = np.zeros_like(sliders)
+    for d_row, d_col in directions:
+        propagate = empty & _LANDING[d_col]
+        flood = sliders
+        for steps in (1, 2, 4):
+            flood = flood | (propagate & _shift(flood, d_row, d_col, steps))
+            propagate = propagate & _shift(propagate, d_row, d_col, steps)
+        attacks |= _step(flood, d_row, d_col)
+    return attacks
+
+
+def load_positions(source):
+    # Packed records from bytes, or a file path to memory-map without reading it in
+    if isinstance(source, str):
+        return np.memmap(source, dtype=RECORD, mode='r')
+    return np.frombuffer(source, dtype=RECORD)
+
+
+def pack_positions(boards):
+    return b''.join(encode(board) for board in boards)
+
+
+def decode_digits(records):
+    # (N, 64) uint8 square digits, 0 for empty and otherwise piece.code + 1,
+    # square order as in Board (row * 8 + col)
+    squares = records['squares']
+    digits = np.empty((len(records), 64), dtype=np.uint8)
+    # The lower square of each pair sits in the high nibble
+    digits[:, 0::2] = squares >> 4
+    digits[:, 1::2] = squares & 15
+    return digits
+
+
+def to_planes(records):
+    # (N, 12, 8, 8) one-hot piece planes in piece code order
+    planes = decode_digits(records)[:, None, :] == np.arange(1, 13, dtype=np.uint8)[None, :, None]
+    return planes.reshape(len(records), 12, 8, 8)
+
+
+def to_bitboards(records):
+    # (N, 12) uint64 bitboards in piece code order, bit n set for square n
+    digits = decode_digits(records)
+    bitboards = np.empty((len(records), 12), dtype=np.uint64)
+    for code in range(12):
+        packed = np.packbits(digits == code + 1, axis=1, bitorder='little')
+        bitboards[:, code] = packed.view('<u8')[:, 0]
+    return bitboards
+
+
+def _tapered(mg, eg, phase):
+    # Same blend and rounding as evaluation.evaluate
+    return (mg * phase + eg * (MAX_PHASE - phase)) // MAX_PHASE
+
+
+def _attack_groups(bitboards, color, empty):
+    # Squares attacked by each group of one side's pieces: pawns, knights,
+    # straight sliders (rooks and queens), diagonal sliders (bishops and queens), king
+    base = 0 if color == 'white' else 6
+    pieces = bitboards[:, base:base + 6]
+    forward = -1 if color == 'white' else 1
+    queens = pieces[:, QUEEN]
+    return (
+        _leaps(pieces[:, PAWN], ((forward, -1), (forward, 1))),
+        _leaps(pieces[:, KNIGHT], KNIGHT_OFFSETS),
+        _slides(pieces[:, ROOK] | queens, empty, ROOK_DIRECTIONS),
+        _slides(pieces[:, BISHOP] | queens, empty, BISHOP_DIRECTIONS),
+        _leaps(pieces[:, KING], KING_OFFSETS),
+    )
+
+
+def evaluate_chunk(records):
+    bitboards = to_bitboards(records)
+    counts = popcount(bitboards)
+    phase = np.minimum(counts @ _PHASE, MAX_PHASE)
+    squares = records['squares'].astype(np.intp) + _PAIR_OFFSETS
+    score = _tapered(*_unpack_score(_PAIR_SCORES[squares].sum(axis=1)), phase)
+    material = _tapered(*_unpack_score(counts @ _MATERIAL), phase)
+
+    white = np.bitwise_or.reduce(bitboards[:, :6], axis=1)
+    black = np.bitwise_or.reduce(bitboards[:, 6:], axis=1)
+    empty = ~(white | black)
+    mobility = np.zeros(len(records), dtype=np.int64)
+    attacked = {}
+    for color, own, sign in (('white', white, 1), ('black', black, -1)):
+        groups = _attack_groups(bitboards, color, empty)
+        # Pawn captures are not mobility, but they do give check
+        for attacks in groups[1:]:
+            mobility += sign * popcount(attacks & ~own)
+        attacked[color] = np.bitwise_or.reduce(groups, axis=0)
+
+    black_to_move = (records['flags'] & BLACK_TO_MOVE) != 0
+    check = np.where(black_to_move, bitboards[:, 6 + KING] & attacked['white'],
+                     bitboards[:, KING] & attacked['black']) != 0
+    return {
+        # Side to move's view, equal to evaluation.evaluate
+        'score': np.where(black_to_move, -score, score),
+        # The rest are from white's view
+        'material': material,
+        'psqt': score - material,
+        'phase': phase,
+        # Squares each piece group attacks that are not its own pieces, summed
+        # over knights, straight sliders, diagonal sliders and king; pins ignored
+        'mobility': mobility,
+        # Side to move is in check, as Board.is_in_check
+        'check': check
+    }
+
+
+def evaluate_batch(records, chunk_size=8192):
+    # Dict of per-position arrays, see evaluate_chunk. Chunks keep the
+    # intermediates cache sized, and memory flat when records is a large memory map
+    if len(records) == 0:
+        return evaluate_chunk(records)
+    results = None
+    for start in range(0, len(records), chunk_size):
+        chunk = evaluate_chunk(records[start:start + chunk_size])
+        if results is None:
+            results = {name: np.empty(len(records), dtype=values.dtype) for name, values in chunk.items()}
+        for name, values in chunk.items():
+            results[name][start:start + chunk_size] = values
+    return results
+
+
+def random_positions(count, max_plies=80, seed=0):
+    # Positions from random games, a stand-in archive for benchmarking
+    rng = random.Random(seed)
+    boards = []
+    while len(boards) < count:
+        board = Board()
+        board.setup_pieces()
+        for _ in range(rng.randrange(max_plies)):
+            moves = board.generate_legal_moves(board.current_turn)
+            if not moves:
+                break
+            board.make_move(rng.choice(moves))
+        boards.append(board)
+    return boards
+
+
+def benchmark(distinct=2000, repeat=500, chunk_size=8192):
+    # Checks a sample against the scalar evaluator, then times a large batch
+    from evaluation import evaluate
+    boards = random_positions(distinct)
+    records = load_positions(pack_positions(boards))
+    results = evaluate_batch(records)
+    mismatches = sum(int(results['score'][i]) != evaluate(board) or
+                     bool(results['check'][i]) != board.is_in_check(board.current_turn)
+                     for i, board in enumerate(boards))
+    print(f"{distinct} positions checked against the scalar evaluator, {mismatches} mismatches")
+
+    records = np.tile(records, repeat)
+    start = time.perf_counter()
+    evaluate_batch(records, chunk_size)
+    elapsed = time.perf_counter() - start
+    print(f"{len(records)} positions in {elapsed:.2f}s, {len(records) / elapsed:,.0f} per second")
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Evaluate a file of packed positions in bulk')
+    parser.add_argument('path', nargs='?', help='file of codec.encode records; benchmark if omitted')
+    parser.add_argument('--chunk-size', type=int, default=8192)
+    args = parser.parse_args(argv)
+
+    if args.path is None:
+        return 1 if benchmark(chunk_size=args.chunk_size) else 0
+    records = load_positions(args.path)
+    results = evaluate_batch(records, args.chunk_size)
+    print(f"{len(records)} positions")
+    for name, values in results.items():
+        print(f"{name:9} mean {values.mean():10.2f} min {values.min():8} max {values.max():8}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,249 @@
+from board import Board
+from pieces import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, piece_code
+
+# Squares are numbered row * 8 + col, matching Board coordinates (row 0 is black's back rank)
+COLORS = ('white', 'black')
+
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+KING_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+ROOK_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+def square_index(row, col):
+    return row * 8 + col
+
+
+def square_coords(square):
+    return divmod(square, 8)
+
+
+def iter_bits(bb):
+    # Yield the square index of every set bit, lowest first
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
+
+
+def _leaper_table(offsets):
+    table = []
+    for square in range(64):
+        row, col = square_coords(square)
+        mask = 0
+        for d_row, d_col in offsets:
+            r, c = row + d_row, col + d_col
+            if 0 <= r < 8 and 0 <= c < 8:
+                mask |= 1 << square_index(r, c)
+        table.append(mask)
+    return table
+
+
+def _ray_table(d_row, d_col):
+    table = []
+    for square in range(64):
+        row, col = square_coords(square)
+        mask = 0
+        r, c = row + d_row, col + d_col
+        while 0 <= r < 8 and 0 <= c < 8:
+            mask |= 1 << square_index(r, c)
+            r, c = r + d_row, c + d_col
+        table.append(mask)
+    return table
+
+
+KNIGHT_ATTACKS = _leaper_table(KNIGHT_OFFSETS)
+KING_ATTACKS = _leaper_table(KING_OFFSETS)
+# PAWN_ATTACKS[color][sq] is the set of squares a pawn of that colour on sq attacks
+PAWN_ATTACKS = {
+    'white': _leaper_table(((-1, -1), (-1, 1))),
+    'black': _leaper_table(((1, -1), (1, 1))),
+}
+
+# Each entry is (ray table, True if the ray runs towards higher square indexes)
+ROOK_RAYS = [(_ray_table(*d), d[0] * 8 + d[1] > 0) for d in ROOK_DIRECTIONS]
+BISHOP_RAYS = [(_ray_table(*d), d[0] * 8 + d[1] > 0) for d in BISHOP_DIRECTIONS]
+# Every board square; the target mask when nothing restricts a move
+ALL_SQUARES = (1 << 64) - 1
+
+
+def _slider_attacks(square, occupied, rays):
+    attacks = 0
+    for table, positive in rays:
+        ray = table[square]
+        blockers = ray & occupied
+        if blockers:
+            # Cut the ray off behind the nearest blocker
+            if positive:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= table[first]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(square, occupied):
+    return _slider_attacks(square, occupied, ROOK_RAYS)
+
+
+def bishop_attacks(square, occupied):
+    return _slider_attacks(square, occupied, BISHOP_RAYS)
+
+
+def queen_attacks(square, occupied):
+    return (_slider_attacks(square, occupied, ROOK_RAYS) |
+            _slider_attacks(square, occupied, BISHOP_RAYS))
+
+
+class BitboardBoard(Board):
+    """Board backend that mirrors the square grid into one 64-bit bitboard per
+    colour and piece type, so attack queries become a few table lookups.
+    Bitboards are indexed by piece code, see pieces.piece_code."""
+
+    def __init__(self):
+        self.pieces = [0] * 12
+        self.occupancy = {'white': 0, 'black': 0}
+        super().__init__()
+
+    def _set_square(self, row, col, piece):
+        bit = 1 << square_index(row, col)
+        old = self.board[row][col]
+        if old:
+            self.pieces[old.code] &= ~bit
+            self.occupancy[old.color] &= ~bit
+        if piece:
+            self.pieces[piece.code] |= bit
+            self.occupancy[piece.color] |= bit
+        super()._set_square(row, col, piece)
+
+    @property
+    def occupied(self):
+        return self.occupancy['white'] | self.occupancy['black']
+
+    def attackers_of(self, square, by_color, occupied=None):
+        # Bitboard of by_color pieces attacking square, through the given
+        # occupancy if one is passed
+        enemy = 'black' if by_color == 'white' else 'white'
+        if occupied is None:
+            occupied = self.occupied
+        base = piece_code(by_color, PAWN)
+        pieces = self.pieces
+        queens = pieces[base + QUEEN]
+        return ((KNIGHT_ATTACKS[square] & pieces[base + KNIGHT]) |
+                (KING_ATTACKS[square] & pieces[base + KING]) |
+                (PAWN_ATTACKS[enemy][square] & pieces[base + PAWN]) |
+                (rook_attacks(square, occupied) & (pieces[base + ROOK] | queens)) |
+                (bishop_attacks(square, occupied) & (pieces[base + BISHOP] | queens)))
+
+    def is_in_check(self, color):
+        king = self.pieces[piece_code(color, KING)]
+        if not king:
+            return False
+        enemy = 'black' if color == 'white' else 'white'
+        return self.attackers_of(king.bit_length() - 1, enemy) != 0
+
+    def is_square_attacked(self, square, by_color):
+        return self.attackers_of(square_index(*square), by_color) != 0
+
+    def _pins(self, king, color, enemy, occupied):
+        # {square: mask} for every color piece pinned to the king on square
+        # king, the mask being the line it may still move along
+        pieces = self.pieces
+        base = piece_code(enemy, PAWN)
+        queens = pieces[base + QUEEN]
+        own = self.occupancy[color]
+        pins = {}
+        for rays, sliders in ((ROOK_RAYS, pieces[base + ROOK] | queens),
+                              (BISHOP_RAYS, pieces[base + BISHOP] | queens)):
+            if not sliders:
+                continue
+            for table, positive in rays:
+                ray = table[king]
+                if not ray & sliders:
+                    continue
+                blockers = ray & occupied
+                first = (blockers & -blockers).bit_length() - 1 if positive else blockers.bit_length() - 1
+                if not own >> first & 1:
+                    continue
+                beyond = table[first] & occupied
+                if not beyond:
+                    continue
+                second = (beyond & -beyond).bit_length() - 1 if positive else beyond.bit_length() - 1
+                if sliders >> second & 1:
+                    pins[first] = ray ^ table[second]
+        return pins
+
+    def _generate(self, color, captures_only):
+        # Legal moves from the attack tables: the king steps to squares that
+        # stay unattacked with it lifted off the board, everything else moves
+        # onto the check line, if any, and along its pin line, if pinned
+        pieces = self.pieces
+        king_bits = pieces[piece_code(color, KING)]
+        if not king_bits:
+            moves = Board.generate_legal_moves(self, color)
+            if captures_only:
+                moves = [move for move in moves if self.board[move[2]][move[3]] is not None]
+            return moves
+        enemy = 'black' if color == 'white' else 'white'
+        own = self.occupancy[color]
+        theirs = self.occupancy[enemy]
+        occupied = own | theirs
+        targets = theirs if captures_only else ~own & ALL_SQUARES
+        king = king_bits.bit_length() - 1
+        king_x, king_y = square_coords(king)
+        checkers = self.attackers_of(king, enemy, occupied)
+
+        moves = []
+        lifted = occupied ^ king_bits
+        for target in iter_bits(KING_ATTACKS[king] & targets):
+            if not self.attackers_of(target, enemy, lifted):
+                moves.append((king_x, king_y) + square_coords(target))
+        if checkers & (checkers - 1):
+            # Only the king can answer a double check
+            return moves
+
+        if checkers:
+            # Capture the checker or, against a slider, block the line to it
+            checker = checkers.bit_length() - 1
+            targets &= checkers
+            for table, _ in ROOK_RAYS + BISHOP_RAYS:
+                if table[king] & checkers:
+                    targets = (table[king] ^ table[checker]) & (theirs if captures_only else ALL_SQUARES)
+                    break
+        pins = self._pins(king, color, enemy, occupied)
+        board = self.board
+        forward = 8 if color == 'black' else -8
+        pawn_attacks = PAWN_ATTACKS[color]
+
+        for square in iter_bits(own ^ king_bits):
+            row, col = square_coords(square)
+            piece = board[row][col]
+            kind = piece.kind
+            if kind == PAWN:
+                reach = pawn_attacks[square] & theirs
+                if not captures_only:
+                    push = square + forward
+                    if 0 <= push < 64 and not occupied >> push & 1:
+                        reach |= 1 << push
+                        double = push + forward
+                        if not piece.has_moved and 0 <= double < 64 and not occupied >> double & 1:
+                            reach |= 1 << double
+            elif kind == KNIGHT:
+                reach = KNIGHT_ATTACKS[square]
+            elif kind == BISHOP:
+                reach = bishop_attacks(square, occupied)
+            elif kind == ROOK:
+                reach = rook_attacks(square, occupied)
+            else:
+                reach = queen_attacks(square, occupied)
+            reach &= targets & pins.get(square, ALL_SQUARES)
+            for target in iter_bits(reach):
+                moves.append((row, col) + square_coords(target))
+        return moves
+
+    def generate_legal_moves(self, color):
+        return self._generate(color, False)
+
+    def generate_captures(self, color):
+        return self._generate(color, True)
@@ -1,9 +1,34 @@
+from zobrist import PIECE_KEYS, BLACK_TO_MOVE
+from evaluation import MG_TABLE, EG_TABLE, PHASE_TABLE
+from pieces import (Queen, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, ROOK_DIRECTIONS, BISHOP_DIRECTIONS,
+                    QUEEN_DIRECTIONS, KNIGHT_OFFSETS, KING_OFFSETS)
+
 class Board:
     def __init__(self):
         self.board = [[None for _ in range(8)] for _ in range(8)]
-        self.current_turn = 'white'  # Track whose turn it is
+        # Zobrist hash of the position, kept current by _set_square and current_turn
+        self.hash = 0
+        # Running tapered evaluation terms, see evaluation.evaluate
+        self.mg_score = 0
+        self.eg_score = 0
+        self.phase = 0
+        self._current_turn = 'white'  # Track whose turn it is
         self.white_king_pos = (7, 4)
         self.black_king_pos = (0, 4)
+        # One (move, piece, captured, had_moved, hash) entry per played move
+        self.undo_stack = []
+        # Per-colour attacker counts for every square, see enable_attack_maps
+        self.attack_maps = None
+
+    @property
+    def current_turn(self):
+        return self._current_turn
+
+    @current_turn.setter
+    def current_turn(self, color):
+        if color != self._current_turn:
+            self.hash ^= BLACK_TO_MOVE
+            self._current_turn = color
         
     def get_piece(self, row, col):
         if self.is_valid_position(row, col):
@@ -13,11 +38,109 @@ class Board:
     def is_valid_position(self, row, col):
         return 0 <= row < 8 and 0 <= col < 8
 
+    def _set_square(self, row, col, piece):
+        # Single write point for the square grid so other backends can mirror it
+        old = self.board[row][col]
+        square = row * 8 + col
+        if old:
+            code = old.code
+            self.hash ^= PIECE_KEYS[code][square]
+            self.mg_score -= MG_TABLE[code][square]
+            self.eg_score -= EG_TABLE[code][square]
+            self.phase -= PHASE_TABLE[code]
+        if piece:
+            code = piece.code
+            self.hash ^= PIECE_KEYS[code][square]
+            self.mg_score += MG_TABLE[code][square]
+            self.eg_score += EG_TABLE[code][square]
+            self.phase += PHASE_TABLE[code]
+
+        if self.attack_maps is None:
+            self.board[row][col] = piece
+            return
+
+        # Sliders looking through this square see further or shorter once it changes
+        sliders = self._sliders_through(row, col)
+        for x, y in sliders:
+            self._add_attacks(x, y, -1)
+        if self.board[row][col]:
+            self._add_attacks(row, col, -1)
+        self.board[row][col] = piece
+        if piece:
+            self._add_attacks(row, col, 1)
+        for x, y in sliders:
+            self._add_attacks(x, y, 1)
+
+    def enable_attack_maps(self):
+        # Start keeping attacker counts per square, updated on every square write
+        self.attack_maps = {color: [[0] * 8 for _ in range(8)] for color in ('white', 'black')}
+        for row in range(8):
+            for col in range(8):
+                if self.board[row][col]:
+                    self._add_attacks(row, col, 1)
+
+    def disable_attack_maps(self):
+        self.attack_maps = None
+
+    def _piece_attacks(self, row, col):
+        # Squares the piece on (row, col) attacks or defends
+        piece = self.board[row][col]
+        kind = piece.kind
+        if kind == PAWN:
+            direction = 1 if piece.color == 'black' else -1
+            offsets = ((direction, -1), (direction, 1))
+        elif kind == KNIGHT:
+            offsets = KNIGHT_OFFSETS
+        elif kind == KING:
+            offsets = KING_OFFSETS
+        else:
+            offsets = None
+
+        squares = []
+        if offsets:
+            for d_row, d_col in offsets:
+                x, y = row + d_row, col + d_col
+                if 0 <= x < 8 and 0 <= y < 8:
+                    squares.append((x, y))
+            return squares
+
+        directions = {ROOK: ROOK_DIRECTIONS, BISHOP: BISHOP_DIRECTIONS}.get(kind, QUEEN_DIRECTIONS)
+        for d_row, d_col in directions:
+            x, y = row + d_row, col + d_col
+            while 0 <= x < 8 and 0 <= y < 8:
+                squares.append((x, y))
+                if self.board[x][y]:
+                    break
+                x += d_row
+                y += d_col
+        return squares
+
+    def _add_attacks(self, row, col, delta):
+        attack_map = self.attack_maps[self.board[row][col].color]
+        for x, y in self._piece_attacks(row, col):
+            attack_map[x][y] += delta
+
+    def _sliders_through(self, row, col):
+        # Sliding pieces of either colour whose line of attack reaches (row, col)
+        sliders = []
+        for d_row, d_col in QUEEN_DIRECTIONS:
+            kinds = (ROOK, QUEEN) if d_row == 0 or d_col == 0 else (BISHOP, QUEEN)
+            x, y = row + d_row, col + d_col
+            while 0 <= x < 8 and 0 <= y < 8:
+                piece = self.board[x][y]
+                if piece:
+                    if piece.kind in kinds:
+                        sliders.append((x, y))
+                    break
+                x += d_row
+                y += d_col
+        return sliders
+
     def place_piece(self, row, col, piece):
         if self.is_valid_position(row, col):
-            self.board[row][col] = piece
+            self._set_square(row, col, piece)
             # Track king positions
-            if piece.__class__.__name__ == 'King':
+            if piece.kind == KING:
                 if piece.color == 'white':
                     self.white_king_pos = (row, col)
                 else:
@@ -27,47 +150,206 @@ class Board:
 
     def is_in_check(self, color):
         king_pos = self.white_king_pos if color == 'white' else self.black_king_pos
-        
-        # Check if any opponent piece can capture the king
-        for row in range(8):
-            for col in range(8):
-                piece = self.get_piece(row, col)
-                if piece and piece.color != color:
-                    if piece.is_valid_move(self, row, col, king_pos[0], king_pos[1]):
+        return self.is_square_attacked(king_pos, 'black' if color == 'white' else 'white')
+
+    def is_square_attacked(self, square, by_color):
+        row, col = square
+        if self.attack_maps is not None:
+            return self.attack_maps[by_color][row][col] > 0
+
+        # Cast rays and knight/king/pawn offsets outward from the square
+        for d_row, d_col in QUEEN_DIRECTIONS:
+            kinds = (ROOK, QUEEN) if d_row == 0 or d_col == 0 else (BISHOP, QUEEN)
+            x, y = row + d_row, col + d_col
+            while 0 <= x < 8 and 0 <= y < 8:
+                piece = self.board[x][y]
+                if piece:
+                    if piece.color == by_color and piece.kind in kinds:
+                        return True
+                    break
+                x += d_row
+                y += d_col
+
+        for offsets, kind in ((KNIGHT_OFFSETS, KNIGHT), (KING_OFFSETS, KING)):
+            for d_row, d_col in offsets:
+                x, y = row + d_row, col + d_col
+                if 0 <= x < 8 and 0 <= y < 8:
+                    piece = self.board[x][y]
+                    if piece and piece.color == by_color and piece.kind == kind:
+                        return True
+
+        # White pawns attack towards row 0, so they sit one row below the square
+        x = row + 1 if by_color == 'white' else row - 1
+        if 0 <= x < 8:
+            for y in (col - 1, col + 1):
+                if 0 <= y < 8:
+                    piece = self.board[x][y]
+                    if piece and piece.color == by_color and piece.kind == PAWN:
                         return True
         return False
 
     def would_be_in_check(self, start_x, start_y, end_x, end_y):
-        # Temporarily make move and check if it results in check
+        # Play the move on the undo stack and check whether it exposes our king
+        color = self.board[start_x][start_y].color
+        self.make_move((start_x, start_y, end_x, end_y))
+        in_check = self.is_in_check(color)
+        self.unmake_move()
+        return in_check
+
+    def make_move(self, move):
+        # Plays a move that is already known to be legal; undo with unmake_move
+        start_x, start_y, end_x, end_y = move
         piece = self.board[start_x][start_y]
-        temp_piece = self.board[end_x][end_y]
-        self.board[end_x][end_y] = piece
-        self.board[start_x][start_y] = None
-        
-        # Update king position if moving king
-        original_king_pos = None
-        if piece.__class__.__name__ == 'King':
+        captured = self.board[end_x][end_y]
+        self.undo_stack.append((move, piece, captured, piece.has_moved, self.hash))
+
+        self._set_square(end_x, end_y, piece)
+        self._set_square(start_x, start_y, None)
+        piece.has_moved = True
+
+        kind = piece.kind
+        if kind == KING:
             if piece.color == 'white':
-                original_king_pos = self.white_king_pos
                 self.white_king_pos = (end_x, end_y)
             else:
-                original_king_pos = self.black_king_pos
                 self.black_king_pos = (end_x, end_y)
-        
-        in_check = self.is_in_check(piece.color)
-        
-        # Restore board state
-        self.board[start_x][start_y] = piece
-        self.board[end_x][end_y] = temp_piece
-        
-        # Restore king position if it was moved
-        if original_king_pos:
+        elif kind == PAWN and end_x == (0 if piece.color == 'white' else 7):
+            self._set_square(end_x, end_y, Queen(piece.color))
+
+        self.current_turn = 'black' if self.current_turn == 'white' else 'white'
+
+    def unmake_move(self):
+        move, piece, captured, had_moved, _ = self.undo_stack.pop()
+        start_x, start_y, end_x, end_y = move
+
+        # Putting the original piece back also reverts a promotion
+        self._set_square(start_x, start_y, piece)
+        self._set_square(end_x, end_y, captured)
+        piece.has_moved = had_moved
+
+        if piece.kind == KING:
             if piece.color == 'white':
-                self.white_king_pos = original_king_pos
+                self.white_king_pos = (start_x, start_y)
             else:
-                self.black_king_pos = original_king_pos
-        
-        return in_check
+                self.black_king_pos = (start_x, start_y)
+
+        self.current_turn = 'black' if self.current_turn == 'white' else 'white'
+
+    def repetition_count(self):
+        # How many earlier positions in the played line match the current one
+        count = 0
+        for move, piece, captured, had_moved, position_hash in reversed(self.undo_stack):
+            # Nothing before a capture or pawn move can occur again
+            if captured is not None or piece.kind == PAWN:
+                break
+            if position_hash == self.hash:
+                count += 1
+        return count
+
+    def search_copy(self):
+        # An independent board for a search on another thread. Of the undo
+        # stack only the entries since the last capture or pawn move come
+        # along, which is all repetition_count reads, so the copy costs the
+        # same however long the game is. It cannot unmake past its start
+        from codec import encode, decode
+        board = decode(encode(self), type(self))
+        if self.attack_maps is not None:
+            board.enable_attack_maps()
+        start = len(self.undo_stack)
+        while start:
+            _, piece, captured, _, _ = self.undo_stack[start - 1]
+            if captured is not None or piece.kind == PAWN:
+                break
+            start -= 1
+        board.undo_stack = self.undo_stack[start:]
+        return board
+
+    def _pins_and_checks(self, color):
+        # Walk outward from the king once to find pinned pieces, checking
+        # pieces and the squares that capture or block a single check
+        king_x, king_y = self.white_king_pos if color == 'white' else self.black_king_pos
+        pins = {}
+        checkers = []
+        evasions = set()
+        king = self.board[king_x][king_y]
+        if not king or king.color != color or king.kind != KING:
+            return pins, checkers, evasions
+
+        for d_row, d_col in QUEEN_DIRECTIONS:
+            sliders = (ROOK, QUEEN) if d_row == 0 or d_col == 0 else (BISHOP, QUEEN)
+            ray = []
+            pinned = None
+            x, y = king_x + d_row, king_y + d_col
+            while self.is_valid_position(x, y):
+                ray.append((x, y))
+                piece = self.board[x][y]
+                if piece:
+                    if piece.color == color:
+                        if pinned:
+                            break
+                        pinned = (x, y)
+                    else:
+                        if piece.kind in sliders:
+                            if pinned:
+                                pins[pinned] = (d_row, d_col)
+                            else:
+                                checkers.append((x, y))
+                                evasions.update(ray)
+                        break
+                x += d_row
+                y += d_col
+
+        for d_row, d_col in KNIGHT_OFFSETS:
+            piece = self.get_piece(king_x + d_row, king_y + d_col)
+            if piece and piece.color != color and piece.kind == KNIGHT:
+                checkers.append((king_x + d_row, king_y + d_col))
+                evasions.add((king_x + d_row, king_y + d_col))
+
+        # Enemy pawns attack the king from the row in front of it
+        pawn_x = king_x - 1 if color == 'white' else king_x + 1
+        for pawn_y in (king_y - 1, king_y + 1):
+            piece = self.get_piece(pawn_x, pawn_y)
+            if piece and piece.color != color and piece.kind == PAWN:
+                checkers.append((pawn_x, pawn_y))
+                evasions.add((pawn_x, pawn_y))
+
+        return pins, checkers, evasions
+
+    def generate_legal_moves(self, color):
+        # Returns every legal (start_x, start_y, end_x, end_y) for color
+        pins, checkers, evasions = self._pins_and_checks(color)
+        king_x, king_y = self.white_king_pos if color == 'white' else self.black_king_pos
+        moves = []
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if not piece or piece.color != color:
+                    continue
+
+                if piece.kind == KING:
+                    for move in piece.generate_moves(self, row, col):
+                        if not self.would_be_in_check(*move):
+                            moves.append(move)
+                    continue
+
+                # Only the king can answer a double check
+                if len(checkers) > 1:
+                    continue
+
+                pin = pins.get((row, col))
+                for move in piece.generate_moves(self, row, col):
+                    end_x, end_y = move[2], move[3]
+                    if checkers and (end_x, end_y) not in evasions:
+                        continue
+                    # A pinned piece may only slide along the pin line
+                    if pin and (end_x - king_x) * pin[1] != (end_y - king_y) * pin[0]:
+                        continue
+                    moves.append(move)
+        return moves
+
+    def generate_captures(self, color):
+        return [move for move in self.generate_legal_moves(color)
+                if self.board[move[2]][move[3]] is not None]
 
     def move_piece(self, start_x, start_y, end_x, end_y):
         if not (self.is_valid_position(start_x, start_y) and self.is_valid_position(end_x, end_y)):
@@ -81,29 +363,11 @@ class Board:
         if not piece.is_valid_move(self, start_x, start_y, end_x, end_y):
             return False
             
-        # Check if move would result in check
-        if self.would_be_in_check(start_x, start_y, end_x, end_y):
+        # Make the move, taking it back if it leaves our own king in check
+        self.make_move((start_x, start_y, end_x, end_y))
+        if self.is_in_check(piece.color):
+            self.unmake_move()
             return False
-            
-        # Make the move
-        self.board[end_x][end_y] = piece
-        self.board[start_x][start_y] = None
-        piece.has_moved = True
-        
-        # Update king position if moving king
-        if piece.__class__.__name__ == 'King':
-            if piece.color == 'white':
-                self.white_king_pos = (end_x, end_y)
-            else:
-                self.black_king_pos = (end_x, end_y)
-        
-        # Handle pawn promotion
-        if piece.__class__.__name__ == 'Pawn':
-            if (piece.color == 'white' and end_x == 0) or (piece.color == 'black' and end_x == 7):
-                from pieces import Queen
-                self.board[end_x][end_y] = Queen(piece.color)
-        
-        self.current_turn = 'black' if self.current_turn == 'white' else 'white'
         return True
     
     def setup_pieces(self):
@@ -128,3 +392,21 @@ class Board:
         for i in range(8):
             self.place_piece(1, i, Pawn('black'))
             self.place_piece(6, i, Pawn('white'))
+
+
+def square_name(row, col):
+    # Row 0 is rank 8, matching the labels drawn on the board
+    return chr(97 + col) + str(8 - row)
+
+
+def move_to_uci(move):
+    start_x, start_y, end_x, end_y = move
+    return square_name(start_x, start_y) + square_name(end_x, end_y)
+
+
+def uci_to_move(text):
+    # Accepts coordinate notation such as 'e2e4' or 'e7e8q'. Pawns always
+    # promote to a queen, so any other promotion suffix is a ValueError
+    if text[4:] not in ('', 'q'):
+        raise ValueError(f"unsupported promotion: {text}")
+    return (8 - int(text[1]), ord(text[0]) - 97, 8 - int(text[3]), ord(text[2]) - 97)
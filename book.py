@@ -0,0 +1,208 @@
+import argparse
+import bisect
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+from array import array
+
+from board import Board
+from codec import encode_text
+from pgn import read_games, san_to_move
+from storage import GameStore
+from transposition import encode_move, decode_move
+
+# Opening book file: a header, then the Zobrist keys of every entry in sorted
+# order, then the matching moves and weights. Keeping the keys in one
+# contiguous little-endian uint64 run lets a memory map of the file be
+# bisected directly, without reading it onto the heap, and every process that
+# opens the same file shares its pages through the OS page cache.
+MAGIC = b'CHESSBK1'
+HEADER = struct.Struct('<8sQ')
+
+
+class OpeningBook:
+    """Read-only, memory-mapped opening book; entries for one position are
+    adjacent and ordered by descending weight."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError(f"{path} is not an opening book")
+        view = memoryview(self.map)
+        keys_end = HEADER.size + 8 * self.size
+        self.keys = view[HEADER.size:keys_end].cast('Q')
+        self.moves = view[keys_end:keys_end + 2 * self.size].cast('H')
+        self.weights = view[keys_end + 2 * self.size:keys_end + 4 * self.size].cast('H')
+
+    @classmethod
+    def open(cls, path):
+        # None if there is no book at path, so callers can treat it as optional
+        if not os.path.exists(path):
+            return None
+        return cls(path)
+
+    def close(self):
+        # The views must be released before the map can close
+        for view in (self.keys, self.moves, self.weights):
+            view.release()
+        self.map.close()
+
+    def __len__(self):
+        return self.size
+
+    def probe(self, key):
+        # [(move, weight), ...] stored for a position hash, best first
+        index = bisect.bisect_left(self.keys, key)
+        entries = []
+        while index < self.size and self.keys[index] == key:
+            entries.append((decode_move(self.moves[index]), self.weights[index]))
+            index += 1
+        return entries
+
+    def choose(self, board, rng=random):
+        # A weighted random book move for the side to move, or None when the
+        # position is out of book
+        entries = self.probe(board.hash)
+        if not entries:
+            return None
+        pick = rng.randrange(sum(weight for _, weight in entries))
+        for move, weight in entries:
+            pick -= weight
+            if pick < 0:
+                break
+        # Only the chosen move is checked, so a hash collision can never
+        # play an illegal move and a hit costs no move generation
+        piece = board.board[move[0]][move[1]]
+        if piece is None or piece.color != board.current_turn or \
+                not piece.is_valid_move(board, *move) or board.would_be_in_check(*move):
+            return None
+        return move
+
+
+def _replay(moves, max_plies):
+    # Yields (position hash, move) for the opening plies of one game, stopping
+    # at the first move that is not legal in this ruleset
+    board = Board()
+    board.setup_pieces()
+    for move in moves[:max_plies]:
+        if move not in board.generate_legal_moves(board.current_turn):
+            return
+        yield board.hash, move
+        board.make_move(move)
+
+
+def _pgn_moves(path):
+    # Each PGN game's moves as board tuples, cut off at the first one this
+    # ruleset cannot play (castling, en passant, under-promotion)
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for game in read_games(f):
+            board = Board()
+            board.setup_pieces()
+            moves = []
+            for san in game['moves']:
+                try:
+                    move = san_to_move(board, san)
+                except ValueError:
+                    break
+                moves.append(move)
+                board.make_move(move)
+            yield moves
+
+
+def _record_moves(path):
+    # Move lists from the move logs saved with game records: a scores.db
+    # store, a scores.json list or a JSON-lines file such as selfplay.py
+    # output. A record's 'moves' only lists captures, so records saved without
+    # a move log, and games that did not start from the initial position, are
+    # skipped
+    if path.endswith('.db'):
+        store = GameStore(path)
+        logs = list(store.move_logs())
+        store.close()
+    else:
+        with open(path, 'r') as f:
+            if path.endswith('.jsonl'):
+                records = [json.loads(line) for line in f if line.strip()]
+            else:
+                records = json.load(f)
+        logs = [record['move_log'] for record in records if record.get('move_log')]
+    board = Board()
+    board.setup_pieces()
+    start = encode_text(board)
+    for log in logs:
+        if log['start'] == start:
+            yield [decode_move(code) for code in log['moves']]
+
+
+def build_book(games, path, max_plies=20, min_count=1):
+    # games is an iterable of move lists from the starting position. Returns
+    # (positions, entries) written
+    counts = {}
+    for moves in games:
+        for key, move in _replay(moves, max_plies):
+            counts[key, move] = counts.get((key, move), 0) + 1
+
+    entries = sorted(((key, -count, encode_move(move)) for (key, move), count in counts.items()
+                      if count >= min_count))
+    keys = array('Q', (key for key, _, _ in entries))
+    moves = array('H', (move for _, _, move in entries))
+    weights = array('H', (min(-count, 0xFFFF) for _, count, _ in entries))
+    if sys.byteorder != 'little':
+        for column in (keys, moves, weights):
+            column.byteswap()
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(entries)))
+        keys.tofile(f)
+        moves.tofile(f)
+        weights.tofile(f)
+    return len({key for key, _, _ in entries}), len(entries)
+
+
+def benchmark(book, probes=100000):
+    # Microseconds per book move chosen in the starting position
+    board = Board()
+    board.setup_pieces()
+    start = time.perf_counter()
+    for _ in range(probes):
+        book.choose(board)
+    return (time.perf_counter() - start) / probes * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or inspect the opening book')
+    parser.add_argument('--output', default='book.bin')
+    parser.add_argument('--pgn', nargs='*', default=[], help='PGN files to read')
+    parser.add_argument('--records', nargs='*', default=[],
+                        help='scores.db, scores.json or selfplay JSON-lines game records')
+    parser.add_argument('--plies', type=int, default=20, help='opening plies to keep per game')
+    parser.add_argument('--min-count', type=int, default=1, help='drop moves played fewer times')
+    args = parser.parse_args(argv)
+
+    if args.pgn or args.records:
+        def games():
+            for path in args.pgn:
+                yield from _pgn_moves(path)
+            for path in args.records:
+                yield from _record_moves(path)
+
+        start = time.perf_counter()
+        positions, entries = build_book(games(), args.output, args.plies, args.min_count)
+        print(f"{positions} positions, {entries} moves written to {args.output} "
+              f"in {time.perf_counter() - start:.2f}s")
+
+    book = OpeningBook(args.output)
+    print(f"{args.output}: {len(book)} entries, {os.path.getsize(args.output)} bytes, "
+          f"{benchmark(book):.1f} us per book move")
+    book.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,12 @@
 import pygame
 import sys
+import queue
+import threading
+import time
 from board import Board
-import random
-import json
+from engine import GameController
+from profiling import PROFILER
 import os
-from datetime import datetime
-
-# Initialize Pygame
-pygame.init()
 
 # Window size settings
 WINDOW_SIZE = 800
@@ -26,9 +25,16 @@ FOREST_GREEN = (34, 139, 34)
 CRIMSON = (220, 20, 60)      
 MOVE_HIGHLIGHT = (124, 252, 0, 128)  
 
-# Display setup
-screen = pygame.display.set_mode((WINDOW_SIZE + 250, WINDOW_SIZE))
-pygame.display.set_caption('Chess Game')
+# Display surface, created by ChessGame
+screen = None
+
+# Posted by the search thread when the CPU's move is ready
+CPU_MOVE_EVENT = pygame.USEREVENT + 1
+# Posted every PROFILE_INTERVAL ms while profiling, to refresh the overlay and dump
+PROFILE_EVENT = pygame.USEREVENT + 2
+PROFILE_INTERVAL = 1000
+PROFILE_PATH = 'profile.json'
+CAPTURE_PATH = 'profile.prof'
 
 def create_gradient_surface(width, height, start_color, end_color):
    
@@ -39,32 +45,54 @@ def create_gradient_surface(width, height, start_color, end_color):
         pygame.draw.line(surface, color, (0, y), (width, y))
     return surface
 
-class ChessGame:
-    def __init__(self):
-        self.board = Board()
-        self.board.setup_pieces()
+class ChessGame(GameController):
+    def __init__(self, board_class=Board, think_time=0.1, workers=1):
+        super().__init__(board_class, think_time, workers)
+        self.migrate_scores()
+        # Display setup happens here rather than at import time
+        global screen
+        pygame.init()
+        screen = pygame.display.set_mode((WINDOW_SIZE + 250, WINDOW_SIZE))
+        pygame.display.set_caption('Chess Game')
         self.selected_piece = None
         self.selected_pos = None
-        self.game_id = self.get_next_game_id()
+        # Legal destinations of the selected piece and the (position hash,
+        # square) they were generated for, see legal_destinations
+        self.destinations = frozenset()
+        self.destinations_key = None
+        # Replay mode: the ply being shown and its board, None while showing the live game
+        self.view_ply = None
+        self.view_board = None
+        # CPU search runs on a worker thread and reports back through this queue
+        self.cpu_results = queue.Queue()
+        self.search_thread = None
+        self.search_id = 0
+        # Bumped on every PROFILE_EVENT so the profile overlay redraws
+        self.profile_tick = 0
         self.piece_images = {}
-        self.scores = self.load_scores()
-        self.current_score = {'white': 0, 'black': 0}
-        self.game_history = []
         self.show_scoreboard = False
         self.load_pieces()
+        # Images in piece.code order so drawing needs no string keys
+        self.code_images = [self.piece_images[f'{color}_{piece}'] for color in ('white', 'black')
+                            for piece in ('pawn', 'knight', 'bishop', 'rook', 'queen', 'king')]
         self.load_game_state()
         self.board_border = 10  # Border width for the chess board
         self.gradient_bg = create_gradient_surface(250, WINDOW_SIZE, 
                                                  (245, 245, 245), (220, 220, 220))
-       #method to get the next game id
-    def get_next_game_id(self):
-       
-        try:
-            with open('scores.json', 'r') as f:
-                scores = json.load(f)
-                return max([score['game_id'] for score in scores], default=-1) + 1
-        except FileNotFoundError:
-            return 0
+        # Fonts and static surfaces are created once, not per frame
+        self.font_title = pygame.font.SysFont('Arial', 24, bold=True)
+        self.font_regular = pygame.font.SysFont('Arial', 20)
+        self.font_small = pygame.font.SysFont('Arial', 18)
+        self.font_coords = pygame.font.SysFont('Arial', 12)
+        self.board_background = self.build_board_background()
+        self.scoreboard_surface = pygame.Surface((250, WINDOW_SIZE))
+        self.selected_highlight = pygame.Surface((SQUARE_SIZE-4, SQUARE_SIZE-4), pygame.SRCALPHA)
+        pygame.draw.rect(self.selected_highlight, HIGHLIGHT, self.selected_highlight.get_rect())
+        self.move_highlight = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
+        pygame.draw.circle(self.move_highlight, MOVE_HIGHLIGHT, (SQUARE_SIZE // 2, SQUARE_SIZE // 2),
+                           SQUARE_SIZE // 6)
+        screen.fill(DARK_BLUE)
+        self.invalidate()
        # method to load the pieces from the assets folder
     def load_pieces(self):
         piece_types = ['pawn', 'rook', 'knight', 'bishop', 'queen', 'king']
@@ -86,180 +114,200 @@ class ChessGame:
                                     (SQUARE_SIZE//2, SQUARE_SIZE//2), SQUARE_SIZE//3)
                     self.piece_images[f'{color}_{piece}'] = surf
 
-#method to load the scores from the scores.json file
-    def load_scores(self):
-       
-        try:
-            with open('scores.json', 'r') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return []
-#method to save the scores to the scores.json file
-    def save_scores(self):
-        
-        with open('scores.json', 'w') as f:
-            json.dump(self.scores, f, indent=4)
-#method to add a new game result to the scores.json file, to show the game, date,number of moves and the winner
-    def add_game_result(self, winner, moves):
-       
-        game_record = {
-            'game_id': self.game_id,
-            'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'winner': winner,
-            'white_score': self.current_score['white'],
-            'black_score': self.current_score['black'],
-            'moves': moves,
-            'total_moves': len(moves)
-        }
-        self.scores.append(game_record)
-        self.save_scores()
-        print(f"Game {self.game_id} saved!")
-
-#method to delete a specific game record from the scores.json file  : Not currently working on the ui
-    def delete_game_record(self, game_id):
-        initial_length = len(self.scores)
-        self.scores = [score for score in self.scores if score['game_id'] != game_id]
-        if len(self.scores) < initial_length:
-            self.save_scores()
-            print(f"Game {game_id} deleted!")
-        else:
-            print(f"Game {game_id} not found!")
+    def delete_game_state(self):
+        super().delete_game_state()
+        self.selected_piece = None
+        self.selected_pos = None
 
-#method to update a specific game record in the scores.json file
-    def update_game_record(self, game_id, winner=None):
-      
-        for score in self.scores:
-            if score['game_id'] == game_id:
-                if winner:
-                    score['winner'] = winner
-                score['white_score'] = self.current_score['white']
-                score['black_score'] = self.current_score['black']
-                score['moves'] = self.game_history
-                score['total_moves'] = len(self.game_history)
-                self.save_scores()
-                print(f"Game {game_id} updated!")
-                return True
-        print(f"Game {game_id} not found!")
-        return False
-#Update each pieces score
-    def calculate_piece_value(self, piece):
-       
-        values = {
-            'Pawn': 1,
-            'Knight': 3,
-            'Bishop': 3,
-            'Rook': 5,
-            'Queen': 9,
-            'King': 0  # King's capture ends the game
-        }
-        return values.get(piece.__class__.__name__, 0)
-#method to move the piece on the board
-    def move_piece(self, start_x, start_y, end_x, end_y):
-       
-        target_piece = self.board.get_piece(end_x, end_y)
-        if target_piece:  # If capturing a piece
-            self.current_score[self.board.current_turn] += self.calculate_piece_value(target_piece)
-            # Record the move in game history
-            self.game_history.append({
-                'move': (start_x, start_y, end_x, end_y),
-                'piece_captured': str(target_piece.__class__.__name__),
-                'turn': self.board.current_turn
-            })
-        
-        # Perform the actual move
-        return self.board.move_piece(start_x, start_y, end_x, end_y)
-#method to save the game state to the game_state.json file
-    def save_game_state(self):
-        game_state = {
-            'board': [[str(piece.__class__.__name__) + "_" + piece.color if piece else None 
-                      for piece in row] for row in self.board.board],
-            'current_turn': self.board.current_turn,
-            'game_id': self.game_id,
-            'current_score': self.current_score,
-            'game_history': self.game_history
-        }
-        with open('game_state.json', 'w') as f:
-            json.dump(game_state, f)
+    def review(self, target):
+        # Shows the position after target plies; reaching the last ply goes back to the live game
+        total = len(self.move_log)
+        target = max(0, min(target, total))
+        if target == total:
+            self.end_review()
+            return
+        ply = total if self.view_ply is None else self.view_ply
+        self.view_board = self.move_log.seek(self.view_board, ply, target, self.board_class)
+        self.view_ply = target
+        self.selected_piece = None
+        self.selected_pos = None
 
-    def load_game_state(self):
-    
-        try:
-            with open('game_state.json', 'r') as f:
-                game_state = json.load(f)
-                self.game_id = game_state['game_id']
-                self.board.current_turn = game_state['current_turn']
-                self.current_score = game_state.get('current_score', {'white': 0, 'black': 0})
-                self.game_history = game_state.get('game_history', [])
-                # Reconstruct board from saved state
-                for i, row in enumerate(game_state['board']):
-                    for j, piece_str in enumerate(row):
-                        if piece_str:
-                            piece_name, color = piece_str.split('_')
-                            piece_class = getattr(__import__('pieces'), piece_name)
-                            self.board.board[i][j] = piece_class(color)
-        except FileNotFoundError:
-            self.board.setup_pieces()
+    def end_review(self):
+        self.view_ply = None
+        self.view_board = None
 
-    def delete_game_state(self):
-       
-        if os.path.exists('game_state.json'):
-            os.remove('game_state.json')
-        self.game_id += 1
-        self.board = Board()
-        self.board.setup_pieces()
+    def take_back(self):
+        # Undoes back to the human's turn, so the CPU's reply goes too
+        self.cancel_cpu_search()
+        self.end_review()
+        self.takeback(2 if self.board.current_turn == 'white' else 1)
         self.selected_piece = None
         self.selected_pos = None
-        self.current_score = {'white': 0, 'black': 0}
-        self.game_history = []
+        if self.board.current_turn == 'black':
+            self.start_cpu_search()
+
+    def load_game_state(self):
+        # A game saved while the CPU was thinking resumes with its reply
+        super().load_game_state()
+        if self.board.current_turn == 'black':
+            self.start_cpu_search()
+
+    def start_cpu_search(self):
+        # The search works on a private copy so the UI thread keeps drawing the real board
+        self.cancel_cpu_search()
+        board = self.board.search_copy()
+        self.search_thread = threading.Thread(target=self._search_worker, args=(board, self.search_id),
+                                              daemon=True)
+        self.search_thread.start()
+
+    def _search_worker(self, board, search_id):
+        # A running cProfile capture on the UI thread cannot see this thread
+        move = PROFILER.capture_call(self.choose_cpu_move, board)
+        self.cpu_results.put((search_id, move, self.searcher.stats()))
+        pygame.event.post(pygame.event.Event(CPU_MOVE_EVENT))
+
+    def cancel_cpu_search(self):
+        # Any result still in flight carries an old id and is dropped
+        self.search_id += 1
+        # Keep asking in case the thread had not entered the search yet
+        while self.search_thread and self.search_thread.is_alive():
+            self.searcher.stop()
+            self.search_thread.join(0.005)
+        self.search_thread = None
+
+    def apply_cpu_results(self):
+        while True:
+            try:
+                search_id, move, stats = self.cpu_results.get_nowait()
+            except queue.Empty:
+                return
+            if search_id == self.search_id and move:
+                self.move_piece(*move)
+                if PROFILER.enabled:
+                    PROFILER.record_search(stats)
+                print(f"CPU: depth {stats['depth']}, {stats['nodes']} nodes, {stats['nps']} nodes/s")
+
+    def legal_destinations(self):
+        # Squares the selected piece can move to. Move generation runs once
+        # per (position, selected square); every other frame is a cache hit
+        if self.selected_pos is None:
+            return frozenset()
+        key = (self.board.hash, self.selected_pos)
+        if key != self.destinations_key:
+            self.destinations_key = key
+            self.destinations = frozenset(
+                (end_x, end_y) for start_x, start_y, end_x, end_y
+                in self.board.generate_legal_moves(self.board.current_turn)
+                if (start_x, start_y) == self.selected_pos)
+        return self.destinations
+
+    def toggle_profiling(self):
+        # Timing wrappers, the overlay and the periodic JSON dump go on and off together
+        if PROFILER.toggle():
+            pygame.time.set_timer(PROFILE_EVENT, PROFILE_INTERVAL)
+            print(f"Profiling on, writing {PROFILE_PATH} every {PROFILE_INTERVAL} ms")
+        else:
+            pygame.time.set_timer(PROFILE_EVENT, 0)
+            PROFILER.dump(PROFILE_PATH)
+            print(f"Profiling off, last report in {PROFILE_PATH}")
+
+    def toggle_capture(self):
+        if PROFILER.capturing:
+            print(PROFILER.stop_capture(CAPTURE_PATH))
+            print(f"cProfile capture written to {CAPTURE_PATH}")
+        else:
+            PROFILER.start_capture()
+            print('cProfile capture started')
+
+    def draw_profile(self, surface, y_pos):
+        # Profile overlay in place of the recent games list
+        font = self.font_coords
+        self.draw_fancy_rect(surface, WHITE, pygame.Rect(10, y_pos, 230, WINDOW_SIZE - y_pos - 10))
+        report = PROFILER.snapshot()
+        frames, searches = report['frames'], report['searches']
+        lines = [
+            (f"Frames {frames['count']}  p50 <{frames['p50_ms']}ms  p95 <{frames['p95_ms']}ms", DARK_BLUE),
+            (f"Frame max {frames['max_ms']:.1f} ms  mean {frames['mean_ms']:.1f} ms", DARK_BLUE),
+            (f"CPU moves {searches['count']}  {searches['nps']} nodes/s", DARK_BLUE),
+        ]
+        if searches['recent']:
+            last = searches['recent'][-1]
+            lines.append((f"Last: depth {last['depth']}  {last['nodes']} nodes  {last['nps']} nps", DARK_BLUE))
+        lines.append(('', BLACK))
+        for label, function in report['functions'].items():
+            if function['calls']:
+                lines.append((label, BLACK))
+                lines.append((f"   {function['calls']} calls  {function['time'] * 1000:.0f} ms  "
+                              f"{function['mean_us']:.1f} us each", FOREST_GREEN))
+        for text, color in lines:
+            if y_pos + 24 > WINDOW_SIZE:
+                break
+            surface.blit(font.render(text, True, color), (20, y_pos + 8))
+            y_pos += 15
 
     def draw_fancy_rect(self, surface, color, rect, border_radius=15):
         
         pygame.draw.rect(surface, color, rect, border_radius=border_radius)
 
     def draw_scoreboard(self):
-     
-        screen.blit(self.gradient_bg, (WINDOW_SIZE, 0))
+        # The panel is rendered into a cached surface and rebuilt only when
+        # the current score or the stored records change. Returns the screen
+        # rect that needs updating, or None.
+        state = (self.current_score['white'], self.current_score['black'], self.scores_version,
+                 self.view_ply, len(self.move_log), self.profile_tick if PROFILER.enabled else None)
+        if state == self.scoreboard_state:
+            return None
+        self.scoreboard_state = state
+        surface = self.scoreboard_surface
+        font_title, font_regular, font_small = self.font_title, self.font_regular, self.font_small
+
+        surface.blit(self.gradient_bg, (0, 0))
         
         
-        pygame.draw.rect(screen, DARK_BLUE, (WINDOW_SIZE-2, 0, 4, WINDOW_SIZE))
+        pygame.draw.rect(surface, DARK_BLUE, (0, 0, 2, WINDOW_SIZE))
         
         # Title section with fancy background
-        title_rect = pygame.Rect(WINDOW_SIZE + 10, 5, 230, 40)
-        self.draw_fancy_rect(screen, DARK_BLUE, title_rect)
-        
-        font_title = pygame.font.SysFont('Arial', 24, bold=True)
-        font_regular = pygame.font.SysFont('Arial', 20)
-        font_small = pygame.font.SysFont('Arial', 18)
+        title_rect = pygame.Rect(10, 5, 230, 40)
+        self.draw_fancy_rect(surface, DARK_BLUE, title_rect)
         
         # Main title
         title = font_title.render('CHESS SCOREBOARD', True, GOLD)
-        screen.blit(title, (WINDOW_SIZE + 25, 12))
+        surface.blit(title, (25, 12))
         
         # Current game section
-        current_section = pygame.Rect(WINDOW_SIZE + 10, 55, 230, 100)
-        self.draw_fancy_rect(screen, (240, 240, 240), current_section)
+        current_section = pygame.Rect(10, 55, 230, 100)
+        self.draw_fancy_rect(surface, (240, 240, 240), current_section)
         
         current_title = font_regular.render('Current Game', True, DARK_BLUE)
-        screen.blit(current_title, (WINDOW_SIZE + 25, 65))
+        surface.blit(current_title, (25, 65))
+        ply = len(self.move_log) if self.view_ply is None else self.view_ply
+        ply_text = font_small.render(f'Ply {ply}/{len(self.move_log)}', True,
+                                     DARK_BLUE if self.view_ply is None else CRIMSON)
+        surface.blit(ply_text, (150, 68))
         
         # Current scores with enhanced styling
-        score_bg = pygame.Rect(WINDOW_SIZE + 20, 95, 210, 50)
-        self.draw_fancy_rect(screen, WHITE, score_bg)
+        score_bg = pygame.Rect(20, 95, 210, 50)
+        self.draw_fancy_rect(surface, WHITE, score_bg)
         
         white_score = font_regular.render(f'White: {self.current_score["white"]}', True, BLACK)
         black_score = font_regular.render(f'Black: {self.current_score["black"]}', True, BLACK)
-        screen.blit(white_score, (WINDOW_SIZE + 30, 100))
-        screen.blit(black_score, (WINDOW_SIZE + 30, 120))
+        surface.blit(white_score, (30, 100))
+        surface.blit(black_score, (30, 120))
         
+        if PROFILER.enabled:
+            surface.blit(font_regular.render('Profile', True, DARK_BLUE), (25, 170))
+            self.draw_profile(surface, 200)
+            return screen.blit(surface, (WINDOW_SIZE, 0))
+
         # Recent games section
         recent_title = font_regular.render('Recent Games', True, DARK_BLUE)
-        screen.blit(recent_title, (WINDOW_SIZE + 25, 170))
+        surface.blit(recent_title, (25, 170))
         
         y_pos = 200
-        for score in sorted(self.scores[-5:], key=lambda x: x['game_id'], reverse=True):
+        for score in self.scores:
             # Game record background
-            record_bg = pygame.Rect(WINDOW_SIZE + 10, y_pos, 230, 80)
-            self.draw_fancy_rect(screen, WHITE, record_bg)
+            record_bg = pygame.Rect(10, y_pos, 230, 80)
+            self.draw_fancy_rect(surface, WHITE, record_bg)
             
             game_text = font_small.render(f'Game {score["game_id"]}', True, DARK_BLUE)
             winner_color = FOREST_GREEN if score["winner"] == "white" else CRIMSON
@@ -267,96 +315,118 @@ class ChessGame:
             score_text = font_small.render(f'W:{score["white_score"]} B:{score["black_score"]}', True, BLACK)
             moves_text = font_small.render(f'Moves: {score.get("total_moves", 0)}', True, DARK_BLUE)
             
-            screen.blit(game_text, (WINDOW_SIZE + 20, y_pos + 5))
-            screen.blit(winner_text, (WINDOW_SIZE + 20, y_pos + 25))
-            screen.blit(score_text, (WINDOW_SIZE + 20, y_pos + 45))
-            screen.blit(moves_text, (WINDOW_SIZE + 20, y_pos + 65))
+            surface.blit(game_text, (20, y_pos + 5))
+            surface.blit(winner_text, (20, y_pos + 25))
+            surface.blit(score_text, (20, y_pos + 45))
+            surface.blit(moves_text, (20, y_pos + 65))
             
             y_pos += 90
 
-    def draw_board(self):
-        # Draw board border
-        pygame.draw.rect(screen, DARK_BLUE, 
-                        (0, 0, WINDOW_SIZE, WINDOW_SIZE))
+        return screen.blit(surface, (WINDOW_SIZE, 0))
+
+    def build_board_background(self):
+        # Border, squares and coordinates never change, so they are drawn once
+        surface = pygame.Surface((WINDOW_SIZE, WINDOW_SIZE))
+        surface.fill(DARK_BLUE)
         
         # Draw squares with wood-like colors
         for row in range(8):
             for col in range(8):
                 color = LIGHT_WOOD if (row + col) % 2 == 0 else DARK_WOOD
-                pygame.draw.rect(screen, color,
+                pygame.draw.rect(surface, color,
                                (col * SQUARE_SIZE + 2, row * SQUARE_SIZE + 2,
                                 SQUARE_SIZE - 4, SQUARE_SIZE - 4))
-                
-                piece = self.board.get_piece(row, col)
-                if piece:
-                    piece_type = piece.__class__.__name__.lower()
-                    image = self.piece_images[f'{piece.color}_{piece_type}']
-                    screen.blit(image, (col * SQUARE_SIZE, row * SQUARE_SIZE))
 
-        # Draw coordinates
-        font = pygame.font.SysFont('Arial', 12)
+        # Coordinates are kept per square so they can be redrawn over pieces
+        self.coordinate_labels = {}
         for i in range(8):
             # Draw rank numbers (1-8)
-            rank = font.render(str(8-i), True, GOLD)
-            screen.blit(rank, (5, i * SQUARE_SIZE + SQUARE_SIZE//2 - 6))
+            rank = self.font_coords.render(str(8-i), True, GOLD)
+            self.coordinate_labels.setdefault((i, 0), []).append(
+                (rank, (5, i * SQUARE_SIZE + SQUARE_SIZE//2 - 6)))
             
             # Draw file letters (a-h)
-            file = font.render(chr(97 + i), True, GOLD)
-            screen.blit(file, (i * SQUARE_SIZE + SQUARE_SIZE//2 - 4, WINDOW_SIZE - 15))
-
-        # Highlight selected piece
-        if self.selected_pos:
-            row, col = self.selected_pos
-            highlight = pygame.Surface((SQUARE_SIZE-4, SQUARE_SIZE-4), pygame.SRCALPHA)
-            pygame.draw.rect(highlight, HIGHLIGHT, highlight.get_rect())
-            screen.blit(highlight, (col * SQUARE_SIZE+2, row * SQUARE_SIZE+2))
-
-    def cpu_move(self):
-     
-# First priority: Try to capture a piece
-        for start_x in range(8):
-            for start_y in range(8):
-                piece = self.board.get_piece(start_x, start_y)
-                if piece and piece.color == 'black':
-                    # Look for possible captures
-                    for end_x in range(8):
-                        for end_y in range(8):
-                            target = self.board.get_piece(end_x, end_y)
-                            if target and target.color == 'white':
-                                if piece.is_valid_move(self.board, start_x, start_y, end_x, end_y):
-                                    # Make the capture move
-                                    self.move_piece(start_x, start_y, end_x, end_y)
-                                    return
-
-# Second priority: Make any valid move
-        valid_moves = []
-        for start_x in range(8):
-            for start_y in range(8):
-                piece = self.board.get_piece(start_x, start_y)
-                if piece and piece.color == 'black':
-                    for end_x in range(8):
-                        for end_y in range(8):
-                            if piece.is_valid_move(self.board, start_x, start_y, end_x, end_y):
-                                valid_moves.append((start_x, start_y, end_x, end_y))
-        
-# Make a random move if any valid moves exist, for the cpu
-        if valid_moves:
-            start_x, start_y, end_x, end_y = random.choice(valid_moves)
-            self.move_piece(start_x, start_y, end_x, end_y)
+            file = self.font_coords.render(chr(97 + i), True, GOLD)
+            self.coordinate_labels.setdefault((7, i), []).append(
+                (file, (i * SQUARE_SIZE + SQUARE_SIZE//2 - 4, WINDOW_SIZE - 15)))
+
+        for labels in self.coordinate_labels.values():
+            for label, pos in labels:
+                surface.blit(label, pos)
+        return surface
+
+    def invalidate(self):
+        # Forces the next frame to redraw every square and the scoreboard
+        self.drawn_squares = [[None] * 8 for _ in range(8)]
+        self.scoreboard_state = None
+
+    def draw_board(self):
+        # Redraws only squares whose piece or highlight changed since the last
+        # frame and returns their rects for pygame.display.update
+        dirty = []
+        destinations = self.legal_destinations()
+        board = self.board if self.view_board is None else self.view_board
+        for row in range(8):
+            for col in range(8):
+                piece = board.board[row][col]
+                state = (piece.code if piece else None, self.selected_pos == (row, col),
+                         (row, col) in destinations)
+                if self.drawn_squares[row][col] == state:
+                    continue
+                self.drawn_squares[row][col] = state
+
+                rect = pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+                screen.blit(self.board_background, rect, rect)
+                if piece:
+                    screen.blit(self.code_images[piece.code], rect)
+                    for label, pos in self.coordinate_labels.get((row, col), ()):
+                        screen.blit(label, pos)
+
+                # Highlight selected piece
+                if state[1]:
+                    screen.blit(self.selected_highlight, (col * SQUARE_SIZE+2, row * SQUARE_SIZE+2))
+                # Overlay the squares the selected piece can move to
+                if state[2]:
+                    screen.blit(self.move_highlight, rect)
+                dirty.append(rect)
+        return dirty
 
     def run(self):
-        clock = pygame.time.Clock()
+        # Sleep until something happens; mouse motion never changes the picture
+        pygame.event.set_blocked(pygame.MOUSEMOTION)
         while True:
-            for event in pygame.event.get():
+            events = [pygame.event.wait()] + pygame.event.get()
+            frame_start = time.perf_counter()
+            for event in events:
                 if event.type == pygame.QUIT:
+                    self.cancel_cpu_search()
+                    if PROFILER.capturing:
+                        self.toggle_capture()
+                    if PROFILER.enabled:
+                        self.toggle_profiling()
                     self.save_game_state()
                     if self.current_score['white'] != 0 or self.current_score['black'] != 0:
                         winner = 'white' if self.current_score['white'] > self.current_score['black'] else 'black'
                         self.add_game_result(winner, self.game_history)
+                    # Last, as it closes the score store
+                    self.close()
                     pygame.quit()
                     sys.exit()
+
+                if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    self.invalidate()
+
+                if event.type == CPU_MOVE_EVENT:
+                    self.apply_cpu_results()
+
+                if event.type == PROFILE_EVENT and PROFILER.enabled:
+                    PROFILER.dump(PROFILE_PATH)
+                    self.profile_tick += 1
                 
                 if event.type == pygame.KEYDOWN:
+                    if event.key in (pygame.K_n, pygame.K_l, pygame.K_d):
+                        self.cancel_cpu_search()
+                        self.end_review()
                     if event.key == pygame.K_n:  # New game
                         if self.current_score['white'] != 0 or self.current_score['black'] != 0:
                             winner = 'white' if self.current_score['white'] > self.current_score['black'] else 'black'
@@ -372,8 +442,26 @@ class ChessGame:
                         self.delete_game_state()
                     elif event.key == pygame.K_h:  # Toggle scoreboard
                         self.show_scoreboard = not self.show_scoreboard
+                    elif event.key == pygame.K_PAGEDOWN:  # Older games
+                        self.page_scores(1)
+                    elif event.key == pygame.K_PAGEUP:  # Newer games
+                        self.page_scores(-1)
+                    elif event.key == pygame.K_i:  # Instrumentation overlay and dumps
+                        self.toggle_profiling()
+                    elif event.key == pygame.K_p:  # Start or stop a cProfile capture
+                        self.toggle_capture()
+                    elif event.key == pygame.K_t:  # Take back the last move
+                        self.take_back()
+                    elif event.key in (pygame.K_LEFT, pygame.K_RIGHT):  # Step through the game
+                        ply = len(self.move_log) if self.view_ply is None else self.view_ply
+                        self.review(ply + (1 if event.key == pygame.K_RIGHT else -1))
+                    elif event.key in (pygame.K_UP, pygame.K_HOME):  # First position
+                        self.review(0)
+                    elif event.key in (pygame.K_DOWN, pygame.K_END):  # Back to the live game
+                        self.end_review()
                 
-                if event.type == pygame.MOUSEBUTTONDOWN and self.board.current_turn == 'white':
+                if event.type == pygame.MOUSEBUTTONDOWN and self.board.current_turn == 'white' \
+                        and self.view_ply is None:
                     x, y = pygame.mouse.get_pos()
                     if x < WINDOW_SIZE:  # Only process clicks on the chess board
                         col = x // SQUARE_SIZE
@@ -382,10 +470,11 @@ class ChessGame:
                         clicked_piece = self.board.get_piece(row, col)
                         
                         if self.selected_piece:
-                            if self.move_piece(self.selected_pos[0], self.selected_pos[1], row, col):
+                            move = (self.selected_pos[0], self.selected_pos[1], row, col)
+                            if (row, col) in self.legal_destinations() and self.move_piece(*move):
                                 self.selected_piece = None
                                 self.selected_pos = None
-                                self.cpu_move()
+                                self.start_cpu_search()
                             else:
                                 if clicked_piece and clicked_piece.color == 'white':
                                     self.selected_piece = clicked_piece
@@ -398,12 +487,24 @@ class ChessGame:
                                 self.selected_piece = clicked_piece
                                 self.selected_pos = (row, col)
 
-            screen.fill(DARK_BLUE) 
-            self.draw_board()
-            self.draw_scoreboard()
-            pygame.display.flip()
-            clock.tick(60)
+            dirty = self.draw_board()
+            scoreboard_rect = self.draw_scoreboard()
+            if scoreboard_rect:
+                dirty.append(scoreboard_rect)
+            if dirty:
+                pygame.display.update(dirty)
+            if PROFILER.enabled:
+                PROFILER.record_frame(time.perf_counter() - frame_start)
+
+PROFILER.register(ChessGame, 'draw_board', 'draw_scoreboard')
 
 if __name__ == "__main__":
-    game = ChessGame()
+    board_class = Board
+    if '--bitboard' in sys.argv:
+        from bitboard import BitboardBoard
+        board_class = BitboardBoard
+    workers = 1
+    if '--workers' in sys.argv:
+        workers = int(sys.argv[sys.argv.index('--workers') + 1])
+    game = ChessGame(board_class, workers=workers)
     game.run() 
@@ -0,0 +1,158 @@
+import base64
+import json
+import struct
+import sys
+import time
+
+import pieces
+from board import Board
+
+PIECE_TYPES = ('Pawn', 'Knight', 'Bishop', 'Rook', 'Queen', 'King')
+PIECE_LETTERS = {'p': 'Pawn', 'n': 'Knight', 'b': 'Bishop', 'r': 'Rook', 'q': 'Queen', 'k': 'King'}
+LETTERS = {name: letter for letter, name in PIECE_LETTERS.items()}
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1'
+
+# Binary layout: 64 four-bit piece codes, a 64-bit has_moved mask, one flags byte (41 bytes)
+POSITION = struct.Struct('<32sQB')
+POSITION_SIZE = POSITION.size
+BLACK_TO_MOVE = 1
+
+
+# One hex digit per square, piece.code + 1 ('0' is empty), with the lower
+# square in the high nibble so bytes.hex() lists the squares in order
+_PIECES = {format(code + 1, 'x'): (getattr(pieces, name), color)
+           for code, (color, name) in enumerate((color, name) for color in ('white', 'black')
+                                                for name in PIECE_TYPES)}
+_DIGITS = [format(code + 1, 'x') for code in range(12)]
+WHITE_KING, BLACK_KING = '6', 'c'
+
+
+def to_fen(board, halfmove=0, fullmove=1):
+    # Castling and en passant do not exist in this ruleset, so those fields are '-'
+    ranks = []
+    for row in board.board:
+        rank = ''
+        empty = 0
+        for piece in row:
+            if piece is None:
+                empty += 1
+                continue
+            if empty:
+                rank += str(empty)
+                empty = 0
+            letter = LETTERS[piece.name]
+            rank += letter.upper() if piece.color == 'white' else letter
+        if empty:
+            rank += str(empty)
+        ranks.append(rank)
+    side = 'w' if board.current_turn == 'white' else 'b'
+    return f"{'/'.join(ranks)} {side} - - {halfmove} {fullmove}"
+
+
+def from_fen(fen, board_class=Board):
+    fields = fen.split()
+    board = board_class()
+    for row, rank in enumerate(fields[0].split('/')):
+        col = 0
+        for char in rank:
+            if char.isdigit():
+                col += int(char)
+                continue
+            color = 'white' if char.isupper() else 'black'
+            piece = getattr(pieces, PIECE_LETTERS[char.lower()])(color)
+            # Pawns off their starting rank have lost the two-square move
+            if piece.kind == pieces.PAWN:
+                piece.has_moved = row != (6 if color == 'white' else 1)
+            board.place_piece(row, col, piece)
+            col += 1
+    if len(fields) > 1 and fields[1] == 'b':
+        board.current_turn = 'black'
+    return board
+
+
+def encode(board):
+    # Fixed-size, lossless encoding including every piece's has_moved flag
+    digits = []
+    moved = 0
+    square = 0
+    for row in board.board:
+        for piece in row:
+            if piece is None:
+                digits.append('0')
+            else:
+                digits.append(_DIGITS[piece.code])
+                if piece.has_moved:
+                    moved |= 1 << square
+            square += 1
+    flags = BLACK_TO_MOVE if board.current_turn == 'black' else 0
+    return POSITION.pack(bytes.fromhex(''.join(digits)), moved, flags)
+
+
+def decode(data, board_class=Board):
+    squares, moved, flags = POSITION.unpack(data)
+    board = board_class()
+    # Writes go straight to _set_square; king squares are tracked here instead
+    set_square = board._set_square
+    for square, digit in enumerate(squares.hex()):
+        if digit == '0':
+            continue
+        piece_class, color = _PIECES[digit]
+        piece = piece_class(color)
+        if moved >> square & 1:
+            piece.has_moved = True
+        row, col = square >> 3, square & 7
+        set_square(row, col, piece)
+        if digit == WHITE_KING:
+            board.white_king_pos = (row, col)
+        elif digit == BLACK_KING:
+            board.black_king_pos = (row, col)
+    if flags & BLACK_TO_MOVE:
+        board.current_turn = 'black'
+    return board
+
+
+def encode_text(board):
+    # Binary encoding wrapped for JSON files
+    return base64.b64encode(encode(board)).decode('ascii')
+
+
+def decode_text(text, board_class=Board):
+    return decode(base64.b64decode(text), board_class)
+
+
+def _legacy_json(board):
+    # The original game_state.json board format, kept for comparison
+    return json.dumps([[piece.name + '_' + piece.color if piece else None
+                        for piece in row] for row in board.board])
+
+
+def _legacy_load(text):
+    board = Board()
+    for i, row in enumerate(json.loads(text)):
+        for j, piece_str in enumerate(row):
+            if piece_str:
+                piece_name, color = piece_str.split('_')
+                board.place_piece(i, j, getattr(pieces, piece_name)(color))
+    return board
+
+
+def benchmark(rounds=2000):
+    # Prints size and per-round-trip time for the legacy JSON grid, FEN and binary
+    board = from_fen('r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w - - 2 3')
+    formats = (
+        ('json grid', _legacy_json, _legacy_load),
+        ('fen', to_fen, from_fen),
+        ('binary', encode, decode),
+    )
+    for name, dump, load in formats:
+        data = dump(board)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            load(dump(board))
+        elapsed = (time.perf_counter() - start) / rounds
+        print(f"{name:10} {len(data):5} bytes {elapsed * 1e6:8.1f} us per round trip")
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
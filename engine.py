@@ -0,0 +1,285 @@
+import json
+import os
+from datetime import datetime
+
+from board import Board
+from book import OpeningBook
+from tablebase import Tablebases
+from codec import PIECE_TYPES, encode_text, decode_text, to_fen
+from movelog import MoveLog
+from pieces import PIECE_VALUES
+from search import Searcher
+from storage import GameStore
+
+# Games shown per scoreboard page
+RECENT_GAMES = 5
+
+# Game logic without any display: board, scoring, history, persistence and the
+# CPU player. chess_game.ChessGame layers the pygame front end on top of this.
+
+
+def board_result(board):
+    # Returns (winner, reason) once the side to move has no legal moves, else None
+    color = board.current_turn
+    if board.generate_legal_moves(color):
+        return None
+    if board.is_in_check(color):
+        return ('black' if color == 'white' else 'white'), 'checkmate'
+    return 'draw', 'stalemate'
+
+
+def choose_move(board, searcher, book=None, tablebases=None):
+    # Book moves while the position is in the opening book, perfect play
+    # once the material is covered by a tablebase, otherwise a search
+    if book:
+        move = book.choose(board)
+        if move:
+            return move
+    if tablebases:
+        move = tablebases.best_move(board)
+        if move:
+            return move
+    return searcher.search(board)
+
+
+class GameController:
+    def __init__(self, board_class=Board, think_time=0.1, workers=1, scores_path='scores.db',
+                 book_path='book.bin', tablebase_dir='tablebases'):
+        # board_class selects the backend, e.g. bitboard.BitboardBoard
+        self.board_class = board_class
+        # think_time is the CPU's wall-clock budget per move in seconds,
+        # workers > 1 splits the search over a process pool
+        if workers > 1:
+            from parallel import ParallelSearcher
+            self.searcher = ParallelSearcher(workers=workers, time_limit=think_time)
+        else:
+            self.searcher = Searcher(time_limit=think_time)
+        # Memory-mapped opening book, None when there is no book file
+        self.book = OpeningBook.open(book_path)
+        # Memory-mapped endgame tables from tablebase.py, None when there are none
+        self.tablebases = Tablebases.open(tablebase_dir)
+        self.board = board_class()
+        self.board.setup_pieces()
+        # scores_path None keeps no records at all, e.g. in selfplay workers;
+        # otherwise the store is opened on first use
+        self.scores_path = scores_path
+        self._store = None
+        self.game_id = self.get_next_game_id()
+        self.scores_page = 0
+        self.scores = self.load_scores()
+        # Bumped on every save so views can tell when the records changed
+        self.scores_version = 0
+        self.current_score = {'white': 0, 'black': 0}
+        self.game_history = []
+        # Every ply of the current game, for replay and takeback
+        self.move_log = MoveLog.from_board(self.board)
+
+    @property
+    def store(self):
+        # The GameStore, or None without a scores_path
+        if self._store is None and self.scores_path is not None:
+            self._store = GameStore(self.scores_path)
+        return self._store
+
+    def migrate_scores(self, json_path='scores.json'):
+        # Imports old scores.json records once, into an empty store. Only the
+        # front ends call this, not every controller
+        if self.store is None or self.store.count() or not os.path.exists(json_path):
+            return
+        self.store.migrate_from_json(json_path)
+        self.game_id = self.get_next_game_id()
+        self.save_scores()
+
+    #method to get the next game id
+    def get_next_game_id(self):
+       
+        return self.store.next_game_id() if self.store else 0
+#method to load the most recent scores for the scoreboard, one page at a time
+    def load_scores(self):
+       
+        if self.store is None:
+            return []
+        return self.store.recent(RECENT_GAMES, self.scores_page * RECENT_GAMES)
+#method to refresh the cached recent scores after a record changed
+    def save_scores(self):
+        
+        self.scores = self.load_scores()
+        self.scores_version += 1
+#method to add a new game result to the score store, to show the game, date,number of moves and the winner
+    def add_game_result(self, winner, moves):
+       
+        game_record = self.build_game_record(winner, moves)
+        if self.store is None:
+            return
+        self.store.add(game_record)
+        self.save_scores()
+        print(f"Game {self.game_id} saved!")
+
+    def build_game_record(self, winner, moves):
+        return {
+            'game_id': self.game_id,
+            'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'winner': winner,
+            'white_score': self.current_score['white'],
+            'black_score': self.current_score['black'],
+            'moves': moves,
+            'total_moves': len(moves),
+            # Every ply, where moves only lists captures; book.py reads these
+            'move_log': self.move_log.to_dict()
+        }
+
+#method to delete a specific game record from the score store
+    def delete_game_record(self, game_id):
+        if self.store and self.store.delete(game_id):
+            self.save_scores()
+            print(f"Game {game_id} deleted!")
+        else:
+            print(f"Game {game_id} not found!")
+
+#method to update a specific game record in the score store
+    def update_game_record(self, game_id, winner=None):
+      
+        fields = {
+            'white_score': self.current_score['white'],
+            'black_score': self.current_score['black'],
+            'moves': self.game_history,
+            'total_moves': len(self.game_history),
+            'move_log': self.move_log.to_dict()
+        }
+        if winner:
+            fields['winner'] = winner
+        if self.store and self.store.update(game_id, fields):
+            self.save_scores()
+            print(f"Game {game_id} updated!")
+            return True
+        print(f"Game {game_id} not found!")
+        return False
+
+    def page_scores(self, step):
+        # Moves the scoreboard one page of older (step=1) or newer (step=-1) games
+        page = max(0, self.scores_page + step)
+        if self.store and page * RECENT_GAMES < self.store.count():
+            self.scores_page = page
+            self.save_scores()
+
+#Update each pieces score
+    def calculate_piece_value(self, piece):
+       
+        return piece.value
+#method to move the piece on the board
+    def move_piece(self, start_x, start_y, end_x, end_y):
+       
+        target_piece = self.board.get_piece(end_x, end_y)
+        turn = self.board.current_turn
+        # Perform the actual move; nothing is recorded if it is illegal
+        if not self.board.move_piece(start_x, start_y, end_x, end_y):
+            return False
+        if target_piece:  # If capturing a piece
+            self.current_score[turn] += self.calculate_piece_value(target_piece)
+            # Record the move in game history
+            self.game_history.append({
+                'move': (start_x, start_y, end_x, end_y),
+                'piece_captured': target_piece.name,
+                'turn': turn
+            })
+        self.move_log.append(self.board, (start_x, start_y, end_x, end_y), target_piece)
+        return True
+
+    def takeback(self, plies=1):
+        # Undoes the last plies moves, scores and capture history included, and
+        # returns how many were undone
+        end = len(self.move_log)
+        plies = min(plies, end)
+        mover = self.board.current_turn
+        for ply in range(end - 1, end - plies - 1, -1):
+            mover = 'black' if mover == 'white' else 'white'
+            captured = self.move_log.captured(ply)
+            if captured is not None:
+                self.current_score[mover] -= PIECE_VALUES[PIECE_TYPES[captured % 6]]
+                self.game_history.pop()
+        self.board = self.move_log.seek(self.board, end, end - plies, self.board_class)
+        self.move_log.truncate(end - plies)
+        return plies
+#method to save the game state to the game_state.json file
+    def save_game_state(self):
+        game_state = {
+            # 'position' is the lossless binary encoding; 'fen' is for people
+            'position': encode_text(self.board),
+            'fen': to_fen(self.board),
+            'game_id': self.game_id,
+            'current_score': self.current_score,
+            'game_history': self.game_history,
+            'move_log': self.move_log.to_dict()
+        }
+        with open('game_state.json', 'w') as f:
+            json.dump(game_state, f)
+
+    def load_game_state(self):
+    
+        try:
+            with open('game_state.json', 'r') as f:
+                game_state = json.load(f)
+                self.game_id = game_state['game_id']
+                self.current_score = game_state.get('current_score', {'white': 0, 'black': 0})
+                self.game_history = game_state.get('game_history', [])
+                if 'position' in game_state:
+                    self.board = decode_text(game_state['position'], self.board_class)
+                else:
+                    # Older saves store a grid of 'Rook_white' style names
+                    board = self.board_class()
+                    for i, row in enumerate(game_state['board']):
+                        for j, piece_str in enumerate(row):
+                            if piece_str:
+                                piece_name, color = piece_str.split('_')
+                                piece_class = getattr(__import__('pieces'), piece_name)
+                                board.place_piece(i, j, piece_class(color))
+                    board.current_turn = game_state['current_turn']
+                    self.board = board
+                # Saves from before the move log start their log at the saved position
+                if 'move_log' in game_state:
+                    self.move_log = MoveLog.from_dict(game_state['move_log'])
+                else:
+                    self.move_log = MoveLog.from_board(self.board)
+        except FileNotFoundError:
+            self.board.setup_pieces()
+            self.move_log = MoveLog.from_board(self.board)
+
+    def delete_game_state(self):
+       
+        if os.path.exists('game_state.json'):
+            os.remove('game_state.json')
+        self.game_id += 1
+        self.reset_game()
+
+    def reset_game(self):
+        # Fresh board and scores without touching any files
+        self.board = self.board_class()
+        self.board.setup_pieces()
+        self.current_score = {'white': 0, 'black': 0}
+        self.game_history = []
+        self.move_log = MoveLog.from_board(self.board)
+
+    def game_result(self):
+        # Returns (winner, reason) once the side to move has no legal moves, else None
+        return board_result(self.board)
+
+    def cpu_move(self):
+     
+        # Plays the CPU's choice for the side to move and returns it
+        move = self.choose_cpu_move(self.board)
+        if move:
+            self.move_piece(*move)
+        return move
+
+    def choose_cpu_move(self, board):
+        return choose_move(board, self.searcher, self.book, self.tablebases)
+
+    def close(self):
+        if hasattr(self.searcher, 'shutdown'):
+            self.searcher.shutdown()
+        if self.book:
+            self.book.close()
+        if self.tablebases:
+            self.tablebases.close()
+        if self._store:
+            self._store.close()
@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Load test for server.py: starts a server process, opens N games over a few
+# pipelined connections and has every game play random legal moves at once.
+# Reports moves per second, move latency percentiles and server memory per
+# session, e.g.
+#   python loadtest.py --sessions 1000 10000 --moves 4 --nodes 50
+
+
+class Connection:
+    """One TCP connection carrying requests for many sessions; responses are
+    matched to their requests by id."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending = {}
+        self.next_id = 0
+        self.listener = asyncio.create_task(self._listen())
+
+    @classmethod
+    async def open(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port, limit=2 ** 20)
+        return cls(reader, writer)
+
+    async def _listen(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            response = json.loads(line)
+            self.pending.pop(response['id']).set_result(response)
+
+    async def request(self, **request):
+        request['id'] = self.next_id
+        self.next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request['id']] = future
+        self.writer.write(json.dumps(request).encode() + b'\n')
+        await self.writer.drain()
+        return await future
+
+    async def close(self):
+        self.writer.close()
+        self.listener.cancel()
+
+
+async def _play(connection, moves, rng, latencies):
+    # One game: a new session, then up to moves random legal moves. Returns the
+    # number of errors the server answered
+    response = await connection.request(cmd='new')
+    session, legal = response['session'], response['legal']
+    errors = 0
+    for _ in range(moves):
+        if not legal:
+            break
+        start = time.perf_counter()
+        response = await connection.request(cmd='move', session=session, move=rng.choice(legal))
+        latencies.append(time.perf_counter() - start)
+        if 'error' in response:
+            errors += 1
+            break
+        legal = response['legal']
+    return errors
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0.0
+
+
+async def run(host, port, sessions, moves, connections, seed):
+    links = [await Connection.open(host, port) for _ in range(connections)]
+    before = await links[0].request(cmd='stats')
+
+    # Sessions are created first so memory per session is measured on idle games
+    rng = random.Random(seed)
+    latencies = []
+    start = time.perf_counter()
+    games = [asyncio.create_task(_play(links[i % connections], 0, rng, latencies))
+             for i in range(sessions)]
+    await asyncio.gather(*games)
+    created = time.perf_counter() - start
+    idle = await links[0].request(cmd='stats')
+
+    start = time.perf_counter()
+    games = [asyncio.create_task(_play(links[i % connections], moves, rng, latencies))
+             for i in range(sessions)]
+    errors = sum(await asyncio.gather(*games))
+    elapsed = time.perf_counter() - start
+    after = await links[0].request(cmd='stats')
+    for link in links:
+        await link.close()
+
+    # Both the human move and the CPU reply count as moves
+    played = after['moves'] - idle['moves']
+    return {
+        'sessions': sessions,
+        'created_per_second': sessions / created,
+        'moves': played,
+        'moves_per_second': played / elapsed,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'bytes_per_session': (idle['rss'] - before['rss']) / sessions,
+        'rss_mb': after['rss'] / 2 ** 20,
+        'errors': errors,
+    }
+
+
+async def start_server(args, store):
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py'),
+               '--host', args.host, '--port', '0', '--store', store,
+               '--think-time', str(args.think_time)]
+    if args.nodes:
+        command += ['--nodes', str(args.nodes)]
+    if args.workers:
+        command += ['--workers', str(args.workers)]
+    process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE)
+    line = (await process.stdout.readline()).decode()
+    if not line.startswith('Serving on'):
+        process.kill()
+        raise RuntimeError('server did not start')
+    return process, int(line.rsplit(':', 1)[1])
+
+
+async def main_async(args):
+    results = []
+    for sessions in args.sessions:
+        # A fresh server and store per size, so sessions do not accumulate
+        with tempfile.TemporaryDirectory() as directory:
+            process, port = await start_server(args, os.path.join(directory, 'sessions.db'))
+            try:
+                result = await run(args.host, port, sessions, args.moves, args.connections, args.seed)
+            finally:
+                process.terminate()
+                await process.wait()
+        results.append(result)
+        print(f"{result['sessions']:>6} sessions {result['moves']:>7} moves "
+              f"{result['moves_per_second']:8.0f} moves/s  p50 {result['p50_ms']:7.1f} ms  "
+              f"p99 {result['p99_ms']:7.1f} ms  {result['bytes_per_session']:6.0f} bytes/session  "
+              f"rss {result['rss_mb']:.0f} MB  {result['errors']} errors", flush=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test the game server')
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--moves', type=int, default=4, help='human moves per game')
+    parser.add_argument('--connections', type=int, default=8)
+    parser.add_argument('--nodes', type=int, default=50, help='node budget per CPU reply')
+    parser.add_argument('--think-time', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    results = asyncio.run(main_async(args))
+    return 1 if any(result['errors'] for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+import sys
+import tracemalloc
+
+from board import Board
+
+# Reports memory per board and allocation counts on the hot paths, so piece
+# representation changes can be compared before and after
+
+
+def board_memory(boards=1000):
+    # Average traced bytes for a set-up board
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = []
+    for _ in range(boards):
+        board = Board()
+        board.setup_pieces()
+        kept.append(board)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) // boards
+
+
+def allocations(func, calls=1000):
+    # Average piece objects constructed and peak temporary bytes per call
+    constructed = 0
+
+    def profile(frame, event, arg):
+        nonlocal constructed
+        if event == 'call' and frame.f_code.co_name == '__init__' and \
+                frame.f_code.co_filename.endswith('pieces.py'):
+            constructed += 1
+
+    sys.setprofile(profile)
+    for _ in range(calls):
+        func()
+    sys.setprofile(None)
+
+    tracemalloc.start()
+    peak = 0
+    for _ in range(calls):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        func()
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    return constructed / calls, peak
+
+
+def main():
+    board = Board()
+    board.setup_pieces()
+    # Open the position up so the queen has lines to slide along
+    board.move_piece(6, 3, 4, 3)
+    board.move_piece(1, 4, 3, 4)
+    queen = board.get_piece(7, 3)
+
+    print(f"{'bytes per board':26} {board_memory()}")
+    size = sys.getsizeof(queen) + (sys.getsizeof(queen.__dict__) if hasattr(queen, '__dict__') else 0)
+    print(f"{'bytes per piece':26} {size}")
+    checks = (
+        ('queen probe', lambda: queen.is_valid_move(board, 7, 3, 5, 3)),
+        ('move list', lambda: board.generate_legal_moves(board.current_turn)),
+    )
+    for name, func in checks:
+        constructed, peak = allocations(func)
+        print(f"{name:26} {constructed:.1f} pieces constructed, {peak} bytes peak per call")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import base64
+from array import array
+
+from board import Board
+from codec import encode, decode, decode_text
+from transposition import encode_move, decode_move
+
+# Plies between stored positions; seeking replays at most this many moves
+CHECKPOINT_INTERVAL = 32
+
+
+class MoveLog:
+    """Every ply of one game as a 16-bit move plus the code of the piece it
+    captured, with the position in codec encoding every interval plies so any
+    ply can be rebuilt without replaying from the start."""
+
+    def __init__(self, start, interval=CHECKPOINT_INTERVAL):
+        # start is the codec encoding of the position before the first ply
+        self.interval = interval
+        self.moves = array('H')
+        # Captured piece code + 1 per ply, 0 when nothing was captured
+        self.captures = bytearray()
+        # checkpoints[i] is the position after i * interval plies
+        self.checkpoints = [start]
+
+    @classmethod
+    def from_board(cls, board, interval=CHECKPOINT_INTERVAL):
+        return cls(encode(board), interval)
+
+    def __len__(self):
+        return len(self.moves)
+
+    def append(self, board, move, captured=None):
+        # Records a ply; board is the position after it
+        self.moves.append(encode_move(move))
+        self.captures.append(captured.code + 1 if captured else 0)
+        if len(self.moves) % self.interval == 0:
+            self.checkpoints.append(encode(board))
+
+    def move(self, ply):
+        return decode_move(self.moves[ply])
+
+    def captured(self, ply):
+        # Code of the piece the ply captured, or None
+        code = self.captures[ply]
+        return code - 1 if code else None
+
+    def truncate(self, plies):
+        # Forgets every ply after the first plies
+        del self.moves[plies:]
+        del self.captures[plies:]
+        del self.checkpoints[plies // self.interval + 1:]
+
+    def position(self, ply, board_class=Board):
+        # A new board holding the position after ply plies
+        checkpoint = ply // self.interval
+        board = decode(self.checkpoints[checkpoint], board_class)
+        for index in range(checkpoint * self.interval, ply):
+            board.make_move(self.move(index))
+        return board
+
+    def seek(self, board, ply, target, board_class=Board):
+        # The position after target plies, given board at ply. Short steps
+        # reuse board, unmaking moves while its undo stack reaches back far
+        # enough; anything else starts over from the nearest checkpoint
+        if board is not None:
+            if 0 <= ply - target <= len(board.undo_stack):
+                for _ in range(ply - target):
+                    board.unmake_move()
+                return board
+            if 0 < target - ply < self.interval:
+                for index in range(ply, target):
+                    board.make_move(self.move(index))
+                return board
+        return self.position(target, board_class)
+
+    def to_dict(self):
+        # JSON-friendly form; checkpoints other than the start are rebuilt on load
+        return {
+            'interval': self.interval,
+            'start': base64.b64encode(self.checkpoints[0]).decode('ascii'),
+            'moves': self.moves.tolist(),
+            'captures': list(self.captures),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        start = decode_text(data['start'])
+        log = cls(encode(start), data.get('interval', CHECKPOINT_INTERVAL))
+        for code, captured in zip(data['moves'], data['captures']):
+            start.make_move(decode_move(code))
+            log.moves.append(code)
+            log.captures.append(captured)
+            if len(log.moves) % log.interval == 0:
+                log.checkpoints.append(encode(start))
+        return log
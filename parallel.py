@@ -0,0 +1,159 @@
+import argparse
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from codec import encode, decode
+from search import Searcher, mvv_lva
+
+# One searcher per worker process so its transposition table survives between moves
+_worker_searcher = None
+
+
+def _init_worker(tt_size_mb, stop_event):
+    global _worker_searcher
+    _worker_searcher = Searcher(tt_size_mb=tt_size_mb)
+    _worker_searcher.stop_event = stop_event
+
+
+def _search_split(position, board_class, root_moves, time_limit, max_nodes):
+    # Runs in a worker: search only this worker's share of the root moves.
+    # The board travels as its compact binary encoding
+    board = decode(position, board_class)
+    _worker_searcher.time_limit = time_limit
+    _worker_searcher.max_nodes = max_nodes
+    move = _worker_searcher.search(board, root_moves)
+    return move, _worker_searcher.best_score, _worker_searcher.stats()
+
+
+class ParallelSearcher:
+    """Root-splitting search: the root moves are dealt out across a process
+    pool, each worker searches its share under the same budget, and the
+    best scoring move wins."""
+
+    def __init__(self, workers=4, time_limit=0.1, max_nodes=None, tt_size_mb=16):
+        self.workers = workers
+        self.time_limit = time_limit
+        self.max_nodes = max_nodes
+        self.tt_size_mb = tt_size_mb
+        self.executor = None
+        # Shared with every worker so stop() reaches searches in other processes
+        self.stop_event = multiprocessing.Event()
+        self.stopped = False
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.nodes = 0
+        self.depth = 0
+        self.best_move = None
+        self.best_score = 0
+        self.elapsed = 0.0
+
+    @property
+    def nps(self):
+        return int(self.nodes / self.elapsed) if self.elapsed > 0 else 0
+
+    def stats(self):
+        return {
+            'nodes': self.nodes,
+            'depth': self.depth,
+            'score': self.best_score,
+            'time': self.elapsed,
+            'nps': self.nps,
+            'workers': self.workers
+        }
+
+    def _pool(self):
+        # Started on first use and kept alive, so process start-up is paid once
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                initargs=(self.tt_size_mb, self.stop_event))
+        return self.executor
+
+    def start(self):
+        # Starts the worker processes now instead of on the first search
+        self._pool().submit(int).result()
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def stop(self):
+        # Workers unwind within 64 nodes; a stopped search returns None, with
+        # best_move holding the best of what the workers had finished
+        self.stopped = True
+        self.stop_event.set()
+
+    def search(self, board):
+        self.reset_stats()
+        self.stopped = False
+        self.stop_event.clear()
+        start = time.perf_counter()
+        moves = board.generate_legal_moves(board.current_turn)
+        if not moves:
+            return None
+
+        # Deal moves out round-robin after sorting so every worker gets some good captures
+        moves.sort(key=lambda move: mvv_lva(board, move), reverse=True)
+        shares = [moves[i::self.workers] for i in range(min(self.workers, len(moves)))]
+        position = encode(board)
+        futures = [self._pool().submit(_search_split, position, type(board), share,
+                                       self.time_limit, self.max_nodes)
+                   for share in shares]
+
+        best_score = None
+        for future in futures:
+            move, score, stats = future.result()
+            self.nodes += stats['nodes']
+            self.depth = max(self.depth, stats['depth'])
+            if move is not None and (best_score is None or score > best_score):
+                best_score, self.best_move = score, move
+
+        self.best_score = best_score or 0
+        self.elapsed = time.perf_counter() - start
+        if self.stopped:
+            return None
+        return self.best_move
+
+
+def measure_scaling(worker_counts, think_time, positions):
+    # Returns {workers: {'nodes': total, 'nps': mean nps, 'depth': mean depth}}
+    from codec import from_fen
+    results = {}
+    for workers in worker_counts:
+        searcher = ParallelSearcher(workers=workers, time_limit=think_time)
+        # Warm the pool up so process start-up does not count against the first position
+        searcher.search(from_fen(positions[0]))
+        nodes, nps, depth = 0, 0, 0
+        for fen in positions:
+            searcher.search(from_fen(fen))
+            nodes += searcher.nodes
+            nps += searcher.nps
+            depth += searcher.depth
+        searcher.shutdown()
+        results[workers] = {
+            'nodes': nodes,
+            'nps': nps // len(positions),
+            'depth': depth / len(positions)
+        }
+    return results
+
+
+def main(argv=None):
+    from perft import POSITIONS
+    parser = argparse.ArgumentParser(description='Measure parallel search scaling at a fixed think time')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--think-time', type=float, default=1.0, help='seconds per position')
+    args = parser.parse_args(argv)
+
+    results = measure_scaling(args.workers, args.think_time, list(POSITIONS.values()))
+    base = results[args.workers[0]]['nps'] or 1
+    print(f"{'workers':>7} {'nodes':>10} {'nps':>9} {'speedup':>8} {'depth':>6}")
+    for workers, result in results.items():
+        print(f"{workers:>7} {result['nodes']:>10} {result['nps']:>9} "
+              f"{result['nps'] / base:>7.2f}x {result['depth']:>6.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+import argparse
+import json
+import sys
+import time
+
+from board import Board, move_to_uci
+from codec import from_fen
+
+# Standard test positions. This ruleset has no castling, en passant or
+# under-promotion, so node counts differ from the published perft tables;
+# perft_baseline.json, saved with --save at depth 3, is the reference for
+# this engine and is checked by test_board.py.
+POSITIONS = {
+    'startpos': 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w',
+    'kiwipete': 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w',
+    'endgame': '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w',
+    'promotions': 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w',
+    'middlegame': 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w',
+}
+
+
+def perft(board, depth):
+    # Number of leaf nodes of the legal move tree, depth plies deep
+    moves = board.generate_legal_moves(board.current_turn)
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        board.make_move(move)
+        nodes += perft(board, depth - 1)
+        board.unmake_move()
+    return nodes
+
+
+def divide(board, depth):
+    # Per root move leaf counts, the usual way to bisect a move generator bug
+    counts = {}
+    for move in board.generate_legal_moves(board.current_turn):
+        board.make_move(move)
+        counts[move_to_uci(move)] = perft(board, depth - 1)
+        board.unmake_move()
+    return counts
+
+
+def run_perft(fen, depth, board_class=Board):
+    board = from_fen(fen, board_class)
+    start = time.perf_counter()
+    nodes = perft(board, depth)
+    elapsed = time.perf_counter() - start
+    return {
+        'nodes': nodes,
+        'time': elapsed,
+        'nps': int(nodes / elapsed) if elapsed > 0 else 0
+    }
+
+
+def compare_to_baseline(results, baseline, tolerance=0.1):
+    # Node count mismatches are correctness bugs; an nps drop beyond
+    # tolerance is reported as a performance regression
+    problems = []
+    for name, depths in results.items():
+        for depth, result in depths.items():
+            expected = baseline.get(name, {}).get(depth)
+            if not expected:
+                continue
+            if result['nodes'] != expected['nodes']:
+                problems.append(f"{name} depth {depth}: {result['nodes']} nodes, expected {expected['nodes']}")
+            elif result['nps'] < expected['nps'] * (1 - tolerance):
+                problems.append(f"{name} depth {depth}: {result['nps']} nps, baseline {expected['nps']}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Count move tree leaves and measure move generation speed')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--position', default='all', help=f"one of {', '.join(POSITIONS)}, 'all' or a FEN")
+    parser.add_argument('--divide', action='store_true', help='print per-move node counts')
+    parser.add_argument('--bitboard', action='store_true', help='use the bitboard backend')
+    parser.add_argument('--save', metavar='FILE', help='write results as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare against a JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed nps drop, as a fraction')
+    args = parser.parse_args(argv)
+
+    board_class = Board
+    if args.bitboard:
+        from bitboard import BitboardBoard
+        board_class = BitboardBoard
+
+    if args.position == 'all':
+        positions = POSITIONS
+    elif args.position in POSITIONS:
+        positions = {args.position: POSITIONS[args.position]}
+    else:
+        positions = {'custom': args.position}
+
+    results = {}
+    for name, fen in positions.items():
+        results[name] = {}
+        for depth in range(1, args.depth + 1):
+            result = run_perft(fen, depth, board_class)
+            results[name][str(depth)] = result
+            print(f"{name:12} depth {depth}: {result['nodes']:>10} nodes "
+                  f"{result['time']:8.3f}s {result['nps']:>9} nps")
+        if args.divide:
+            for move, count in sorted(divide(from_fen(fen, board_class), args.depth).items()):
+                print(f"  {move}: {count}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"Baseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        problems = compare_to_baseline(results, baseline, args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
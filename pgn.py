@@ -0,0 +1,103 @@
+import re
+
+from pieces import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+
+SAN_KINDS = {'N': KNIGHT, 'B': BISHOP, 'R': ROOK, 'Q': QUEEN, 'K': KING}
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+# Check marks and move assessments that may trail a SAN move
+ANNOTATIONS = '+#!?'
+
+_HEADER = re.compile(r'\[(\w+)\s+"(.*)"\]')
+# Comments, variations and numeric annotations are skipped; variations may nest
+_TOKEN = re.compile(r'\{[^}]*\}?|;.*|\(|\)|\$\d+|\d+\.+|[^\s(){};]+')
+
+
+def read_games(lines):
+    # Yields {'headers': {...}, 'moves': [san, ...], 'result': str} one game at
+    # a time from any iterable of lines, so archives are never held in memory
+    headers, moves, result = {}, [], '*'
+    depth = 0
+    in_comment = False
+    for line in lines:
+        line = line.strip()
+        if in_comment:
+            if '}' not in line:
+                continue
+            line = line[line.index('}') + 1:]
+            in_comment = False
+        if not line or line.startswith('%'):
+            continue
+        if line.startswith('[') and depth == 0:
+            match = _HEADER.match(line)
+            if match:
+                if moves:
+                    yield {'headers': headers, 'moves': moves, 'result': result}
+                    headers, moves, result = {}, [], '*'
+                headers[match.group(1)] = match.group(2)
+            continue
+        for token in _TOKEN.findall(line):
+            if token.startswith('{'):
+                in_comment = not token.endswith('}')
+            elif token == '(':
+                depth += 1
+            elif token == ')':
+                depth = max(depth - 1, 0)
+            elif depth or token[0] in ';$' or token[0].isdigit() and token.endswith('.'):
+                continue
+            elif not token.strip(ANNOTATIONS):
+                # Annotations written apart from their move, e.g. '!?' or '+'
+                continue
+            elif token in RESULTS:
+                result = token
+                yield {'headers': headers, 'moves': moves, 'result': result}
+                headers, moves, result = {}, [], '*'
+            else:
+                moves.append(token)
+    if moves or headers:
+        yield {'headers': headers, 'moves': moves, 'result': result}
+
+
+def parse_square(text):
+    # 'e4' -> (row, col) in Board coordinates
+    return 8 - int(text[1]), ord(text[0]) - ord('a')
+
+
+def san_to_move(board, san):
+    # The legal move for the side to move that the SAN string names. Raises
+    # ValueError for anything this ruleset cannot play: castling, en passant
+    # and under-promotion
+    text = san.rstrip(ANNOTATIONS)
+    if not text:
+        raise ValueError(f"bad SAN move: {san}")
+    if text.startswith('O-O') or text.startswith('0-0'):
+        raise ValueError(f"castling is not supported: {san}")
+    if '=' in text:
+        text, promotion = text.split('=', 1)
+        if promotion != 'Q':
+            raise ValueError(f"only queen promotion is supported: {san}")
+    kind = SAN_KINDS.get(text[0], PAWN)
+    if kind != PAWN:
+        text = text[1:]
+    text = text.replace('x', '')
+    if len(text) < 2:
+        raise ValueError(f"bad SAN move: {san}")
+    end_x, end_y = parse_square(text[-2:])
+    hint = text[:-2]
+
+    # Only pieces of the named kind are tried against the destination, which
+    # is far cheaper than generating every legal move each ply
+    color = board.current_turn
+    matches = []
+    for start_x in range(8):
+        for start_y in range(8):
+            piece = board.board[start_x][start_y]
+            if not piece or piece.color != color or piece.kind != kind:
+                continue
+            if any(char != ('abcdefgh'[start_y] if char.isalpha() else str(8 - start_x)) for char in hint):
+                continue
+            move = (start_x, start_y, end_x, end_y)
+            if piece.is_valid_move(board, *move) and not board.would_be_in_check(*move):
+                matches.append(move)
+    if len(matches) != 1:
+        raise ValueError(f"{'ambiguous' if matches else 'illegal'} SAN move: {san}")
+    return matches[0]
@@ -0,0 +1,212 @@
+import argparse
+import bz2
+import gzip
+import json
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from board import Board
+from engine import board_result
+from pgn import read_games, san_to_move
+
+# Replays PGN archives on Board and aggregates statistics. The archive is
+# streamed: the main process tokenizes games with pgn.read_games and deals
+# them out in chunks to a process pool that does the replaying, with only a
+# few chunks in flight at once, so memory stays flat however large the file.
+
+# Games per pool task; large enough to amortise pickling the chunk
+CHUNK_SIZE = 200
+# Game lengths are counted in buckets of this many plies
+LENGTH_BUCKET = 20
+
+
+def open_archive(path):
+    # Text stream over a PGN file, compressed or not
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, 'r', encoding='utf-8', errors='replace')
+
+
+class Summary:
+    """Counts over many replayed games; summaries from different workers
+    merge into one."""
+
+    def __init__(self):
+        self.games = 0
+        self.plies = 0
+        self.longest = 0
+        self.results = {}
+        self.lengths = {}
+        # Captured pieces by name and by the side that captured, as in game_history
+        self.captures = {}
+        self.captures_by = {'white': 0, 'black': 0}
+        # Games that ended in checkmate or stalemate on the board
+        self.endings = {}
+        # Games cut short at a move this ruleset cannot play, by reason
+        self.truncated = {}
+
+    def add(self, result, plies, captures, ending, truncated):
+        self.games += 1
+        self.plies += plies
+        self.longest = max(self.longest, plies)
+        _count(self.results, result)
+        _count(self.lengths, plies // LENGTH_BUCKET * LENGTH_BUCKET)
+        for name, turn in captures:
+            _count(self.captures, name)
+            self.captures_by[turn] += 1
+        if ending:
+            _count(self.endings, ending)
+        if truncated:
+            _count(self.truncated, truncated)
+
+    def merge(self, other):
+        self.games += other.games
+        self.plies += other.plies
+        self.longest = max(self.longest, other.longest)
+        for mine, theirs in ((self.results, other.results), (self.lengths, other.lengths),
+                             (self.captures, other.captures), (self.captures_by, other.captures_by),
+                             (self.endings, other.endings), (self.truncated, other.truncated)):
+            for key, count in theirs.items():
+                _count(mine, key, count)
+
+    def to_dict(self):
+        return {
+            'games': self.games,
+            'plies': self.plies,
+            'average_plies': self.plies / self.games if self.games else 0,
+            'longest': self.longest,
+            'results': self.results,
+            'lengths': dict(sorted(self.lengths.items())),
+            'captures': self.captures,
+            'captures_by': self.captures_by,
+            'endings': self.endings,
+            'truncated': self.truncated,
+        }
+
+
+def _count(counts, key, amount=1):
+    counts[key] = counts.get(key, 0) + amount
+
+
+def replay(moves):
+    # Plays SAN moves from the starting position. Returns (plies, captures,
+    # ending, truncated): captures is [(piece name, capturing side), ...],
+    # ending is the on-board checkmate or stalemate if the game reached one and
+    # truncated why replay stopped early, if it did
+    board = Board()
+    board.setup_pieces()
+    captures = []
+    truncated = None
+    for san in moves:
+        try:
+            move = san_to_move(board, san)
+        except ValueError as e:
+            message = str(e)
+            truncated = ('castling' if 'castling' in message else
+                         'under-promotion' if 'promotion' in message else 'illegal')
+            break
+        target = board.board[move[2]][move[3]]
+        if target:
+            captures.append((target.name, board.current_turn))
+        board.make_move(move)
+    result = None if truncated else board_result(board)
+    return len(board.undo_stack), captures, result[1] if result else None, truncated
+
+
+def analyze_chunk(games):
+    # Runs in a worker: games is [(moves, result), ...]
+    summary = Summary()
+    for moves, result in games:
+        summary.add(result, *replay(moves))
+    return summary
+
+
+def _chunks(paths, chunk_size):
+    # Only the move list and result of each game leave the reader
+    chunk = []
+    for path in paths:
+        with open_archive(path) as f:
+            for game in read_games(f):
+                chunk.append((game['moves'], game['result']))
+                if len(chunk) == chunk_size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+def analyze_archive(paths, workers=None, chunk_size=CHUNK_SIZE, max_games=None, progress=None):
+    # Returns the Summary of every game in paths. progress, if given, is called
+    # with the running Summary as chunks complete
+    workers = workers or os.cpu_count() or 1
+    total = Summary()
+    chunks = _chunks(paths, chunk_size)
+    submitted = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for chunk in chunks:
+            if max_games is not None:
+                if submitted >= max_games:
+                    break
+                chunk = chunk[:max_games - submitted]
+            submitted += len(chunk)
+            # Two chunks per worker keeps every worker busy without reading ahead
+            while len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    total.merge(future.result())
+                if progress:
+                    progress(total)
+            pending.add(pool.submit(analyze_chunk, chunk))
+        for future in pending:
+            total.merge(future.result())
+    return total
+
+
+def peak_memory():
+    # Peak resident set size of this process in bytes (Linux reports KB)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay PGN archives and report statistics')
+    parser.add_argument('paths', nargs='+', help='PGN files, optionally .gz or .bz2')
+    parser.add_argument('--workers', type=int, default=None, help='defaults to the number of cores')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='games per pool task')
+    parser.add_argument('--max-games', type=int, default=None)
+    parser.add_argument('--json', help='also write the summary to this file')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+
+    def progress(summary):
+        elapsed = time.perf_counter() - start
+        print(f"\r{summary.games} games, {summary.games / elapsed:.0f} games/s", end='', flush=True)
+
+    summary = analyze_archive(args.paths, args.workers, args.chunk_size, args.max_games, progress)
+    elapsed = time.perf_counter() - start
+    report = summary.to_dict()
+    report['time'] = elapsed
+    report['games_per_sec'] = summary.games / elapsed if elapsed > 0 else 0
+    report['peak_memory'] = peak_memory()
+
+    print(f"\r{summary.games} games, {summary.plies} plies in {elapsed:.1f}s "
+          f"({report['games_per_sec']:.1f} games/s, {summary.plies / elapsed:.0f} plies/s), "
+          f"peak memory {report['peak_memory'] / 2 ** 20:.0f} MB")
+    print(f"Average length: {report['average_plies']:.1f} plies, longest {summary.longest}")
+    for title, counts in (('Results', summary.results), ('Endings', summary.endings),
+                          ('Captures', summary.captures), ('Captures by', summary.captures_by),
+                          ('Cut short', summary.truncated), ('Lengths', report['lengths'])):
+        if counts:
+            print(f"{title}: " + ', '.join(f"{key}: {count}" for key, count in counts.items()))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,36 @@
+# Material values shared by scoring and the CPU search
+PIECE_VALUES = {
+    'Pawn': 1,
+    'Knight': 3,
+    'Bishop': 3,
+    'Rook': 5,
+    'Queen': 9,
+    'King': 0  # King's capture ends the game
+}
+
+WHITE = 'white'
+BLACK = 'black'
+
+# Integer piece kinds; dispatch on these instead of class name strings
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+SLIDERS = (ROOK, BISHOP, QUEEN)
+
+def piece_code(color, kind):
+    # 0-5 white pawn..king, 6-11 black pawn..king; used to index per-piece tables
+    return kind + 6 if color == BLACK else kind
+
 class Piece:
+    # No per-instance __dict__: a piece is its colour, move flag and table code
+    __slots__ = ('color', 'has_moved', 'code')
+    kind = None
+    name = None
+    value = 0
+
     def __init__(self, color):
-        self.color = color
+        # Normalise to the shared constants so colour checks compare interned strings
+        self.color = BLACK if color == BLACK else WHITE
         self.has_moved = False
+        self.code = None if self.kind is None else piece_code(self.color, self.kind)
 
     def is_valid_move(self, board, start_x, start_y, end_x, end_y):
         # Base validation for all pieces
@@ -14,7 +43,48 @@ class Piece:
         
         return True
 
+    def generate_moves(self, board, row, col):
+        # Pseudo-legal destinations; Board filters out moves that leave the king in check
+        return []
+
+    def _step_moves(self, board, row, col, offsets):
+        moves = []
+        for d_row, d_col in offsets:
+            end_x, end_y = row + d_row, col + d_col
+            if board.is_valid_position(end_x, end_y):
+                target = board.get_piece(end_x, end_y)
+                if target is None or target.color != self.color:
+                    moves.append((row, col, end_x, end_y))
+        return moves
+
+    def _slide_moves(self, board, row, col, directions):
+        moves = []
+        for d_row, d_col in directions:
+            end_x, end_y = row + d_row, col + d_col
+            while board.is_valid_position(end_x, end_y):
+                target = board.get_piece(end_x, end_y)
+                if target is None:
+                    moves.append((row, col, end_x, end_y))
+                else:
+                    if target.color != self.color:
+                        moves.append((row, col, end_x, end_y))
+                    break
+                end_x += d_row
+                end_y += d_col
+        return moves
+
+ROOK_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+QUEEN_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+KING_OFFSETS = QUEEN_DIRECTIONS
+
 class Pawn(Piece):
+    __slots__ = ()
+    kind = PAWN
+    name = 'Pawn'
+    value = PIECE_VALUES['Pawn']
+
     def is_valid_move(self, board, start_x, start_y, end_x, end_y):
         if not super().is_valid_move(board, start_x, start_y, end_x, end_y):
             return False
@@ -36,7 +106,31 @@ class Pawn(Piece):
             
         return False
 
+    def generate_moves(self, board, row, col):
+        moves = []
+        direction = 1 if self.color == 'black' else -1
+        end_x = row + direction
+        if not board.is_valid_position(end_x, col):
+            return moves
+
+        if board.get_piece(end_x, col) is None:
+            moves.append((row, col, end_x, col))
+            if (not self.has_moved and board.is_valid_position(end_x + direction, col) and
+                    board.get_piece(end_x + direction, col) is None):
+                moves.append((row, col, end_x + direction, col))
+
+        for end_y in (col - 1, col + 1):
+            target = board.get_piece(end_x, end_y)
+            if target and target.color != self.color:
+                moves.append((row, col, end_x, end_y))
+        return moves
+
 class Rook(Piece):
+    __slots__ = ()
+    kind = ROOK
+    name = 'Rook'
+    value = PIECE_VALUES['Rook']
+
     def is_valid_move(self, board, start_x, start_y, end_x, end_y):
         if not super().is_valid_move(board, start_x, start_y, end_x, end_y):
             return False
@@ -57,7 +151,15 @@ class Rook(Piece):
             
         return True
 
+    def generate_moves(self, board, row, col):
+        return self._slide_moves(board, row, col, ROOK_DIRECTIONS)
+
 class Knight(Piece):
+    __slots__ = ()
+    kind = KNIGHT
+    name = 'Knight'
+    value = PIECE_VALUES['Knight']
+
     def is_valid_move(self, board, start_x, start_y, end_x, end_y):
         if not super().is_valid_move(board, start_x, start_y, end_x, end_y):
             return False
@@ -66,7 +168,15 @@ class Knight(Piece):
         y_diff = abs(end_y - start_y)
         return (x_diff == 2 and y_diff == 1) or (x_diff == 1 and y_diff == 2)
 
+    def generate_moves(self, board, row, col):
+        return self._step_moves(board, row, col, KNIGHT_OFFSETS)
+
 class Bishop(Piece):
+    __slots__ = ()
+    kind = BISHOP
+    name = 'Bishop'
+    value = PIECE_VALUES['Bishop']
+
     def is_valid_move(self, board, start_x, start_y, end_x, end_y):
         if not super().is_valid_move(board, start_x, start_y, end_x, end_y):
             return False
@@ -86,17 +196,50 @@ class Bishop(Piece):
             
         return True
 
+    def generate_moves(self, board, row, col):
+        return self._slide_moves(board, row, col, BISHOP_DIRECTIONS)
+
 class Queen(Piece):
+    __slots__ = ()
+    kind = QUEEN
+    name = 'Queen'
+    value = PIECE_VALUES['Queen']
+
     def is_valid_move(self, board, start_x, start_y, end_x, end_y):
-        # Queen combines Rook and Bishop movements
-        rook = Rook(self.color)
-        bishop = Bishop(self.color)
-        return (rook.is_valid_move(board, start_x, start_y, end_x, end_y) or 
-                bishop.is_valid_move(board, start_x, start_y, end_x, end_y))
+        # Queen combines Rook and Bishop movements along one straight or diagonal line
+        if not super().is_valid_move(board, start_x, start_y, end_x, end_y):
+            return False
+
+        x_diff = end_x - start_x
+        y_diff = end_y - start_y
+        if x_diff != 0 and y_diff != 0 and abs(x_diff) != abs(y_diff):
+            return False
+
+        step_x = (x_diff > 0) - (x_diff < 0)
+        step_y = (y_diff > 0) - (y_diff < 0)
+        current_x, current_y = start_x + step_x, start_y + step_y
+        while (current_x, current_y) != (end_x, end_y):
+            if board.get_piece(current_x, current_y):
+                return False
+            current_x += step_x
+            current_y += step_y
+
+        return True
+
+    def generate_moves(self, board, row, col):
+        return self._slide_moves(board, row, col, QUEEN_DIRECTIONS)
 
 class King(Piece):
+    __slots__ = ()
+    kind = KING
+    name = 'King'
+    value = PIECE_VALUES['King']
+
     def is_valid_move(self, board, start_x, start_y, end_x, end_y):
         if not super().is_valid_move(board, start_x, start_y, end_x, end_y):
             return False
             
-        return abs(end_x - start_x) <= 1 and abs(end_y - start_y) <= 1 
\ No newline at end of file
+        return abs(end_x - start_x) <= 1 and abs(end_y - start_y) <= 1 
+
+    def generate_moves(self, board, row, col):
+        return self._step_moves(board, row, col, KING_OFFSETS)
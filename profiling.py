@@ -0,0 +1,200 @@
+import cProfile
+import functools
+import io
+import json
+import pstats
+import time
+from collections import deque
+
+from bitboard import BitboardBoard
+from board import Board
+from engine import GameController
+from pieces import Piece, Pawn, Knight, Bishop, Rook, Queen, King
+from storage import GameStore
+
+# Instrumentation for finding where time goes in the game and the CPU player.
+# Timed methods are wrapped only while profiling is enabled and restored on
+# disable, so a disabled profiler adds no cost to the hot paths at all; the
+# only remaining checks are one attribute test per frame and per CPU move.
+
+# Frame time histogram bucket upper bounds in milliseconds
+FRAME_BUCKETS = (1, 2, 4, 8, 16, 33, 66, 100, 250, float('inf'))
+# Per-move search stats kept for the report
+RECENT_SEARCHES = 100
+
+
+class Profiler:
+    """Call counts and cumulative wall time for registered methods, frame
+    times, per-move search stats and on-demand cProfile captures."""
+
+    def __init__(self):
+        self.targets = []
+        self.originals = {}
+        self.enabled = False
+        self.capture = None
+        self.reset()
+
+    def reset(self):
+        # label -> [calls, seconds]; the lists are shared with the installed wrappers
+        self.counters = {}
+        self.frames = [0] * len(FRAME_BUCKETS)
+        self.frame_total = 0.0
+        self.frame_max = 0.0
+        self.searches = deque(maxlen=RECENT_SEARCHES)
+        self.search_count = 0
+        self.search_nodes = 0
+        self.search_time = 0.0
+        if self.enabled:
+            # Wrappers hold the old counters, so they have to be rebuilt
+            self.disable()
+            self.enable()
+
+    def register(self, owner, *names):
+        # Times owner.name for every name the class itself defines, labelled
+        # 'Class.name'. Overrides that call super() count in both classes
+        for name in names:
+            if name in owner.__dict__:
+                self.targets.append((owner, name))
+
+    def enable(self):
+        if self.enabled:
+            return
+        for owner, name in self.targets:
+            original = owner.__dict__[name]
+            self.originals[owner, name] = original
+            setattr(owner, name, self._wrap(f"{owner.__name__}.{name}", original))
+        self.enabled = True
+
+    def disable(self):
+        if not self.enabled:
+            return
+        for (owner, name), original in self.originals.items():
+            setattr(owner, name, original)
+        self.originals = {}
+        self.enabled = False
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+        return self.enabled
+
+    def _wrap(self, label, func):
+        counter = self.counters.setdefault(label, [0, 0.0])
+        clock = time.perf_counter
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                counter[0] += 1
+                counter[1] += clock() - start
+        return timed
+
+    def record_frame(self, seconds):
+        milliseconds = seconds * 1000
+        for i, bound in enumerate(FRAME_BUCKETS):
+            if milliseconds <= bound:
+                self.frames[i] += 1
+                break
+        self.frame_total += seconds
+        self.frame_max = max(self.frame_max, seconds)
+
+    def record_search(self, stats):
+        # stats is a Searcher.stats() dict for one CPU move
+        self.searches.append(dict(stats))
+        self.search_count += 1
+        self.search_nodes += stats['nodes']
+        self.search_time += stats['time']
+
+    def frame_percentile(self, fraction):
+        # Upper bound in milliseconds of the bucket holding that fraction of frames
+        total = sum(self.frames)
+        seen = 0
+        for bound, count in zip(FRAME_BUCKETS, self.frames):
+            seen += count
+            if total and seen >= total * fraction:
+                # The open-ended last bucket reports the slowest frame instead
+                return bound if bound != FRAME_BUCKETS[-1] else round(self.frame_max * 1000)
+        return 0
+
+    def snapshot(self):
+        frames = sum(self.frames)
+        return {
+            'enabled': self.enabled,
+            'functions': {label: {'calls': calls, 'time': seconds,
+                                  'mean_us': seconds / calls * 1e6 if calls else 0}
+                          for label, (calls, seconds) in
+                          sorted(self.counters.items(), key=lambda item: -item[1][1])},
+            'frames': {
+                'count': frames,
+                'mean_ms': self.frame_total / frames * 1000 if frames else 0,
+                'max_ms': self.frame_max * 1000,
+                'p50_ms': self.frame_percentile(0.5),
+                'p95_ms': self.frame_percentile(0.95),
+                'histogram': {f"<={bound}ms" if bound != FRAME_BUCKETS[-1] else f">{FRAME_BUCKETS[-2]}ms": count
+                              for bound, count in zip(FRAME_BUCKETS, self.frames)},
+            },
+            'searches': {
+                'count': self.search_count,
+                'nodes': self.search_nodes,
+                'nps': int(self.search_nodes / self.search_time) if self.search_time > 0 else 0,
+                'recent': list(self.searches),
+            },
+        }
+
+    def dump(self, path='profile.json'):
+        with open(path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def start_capture(self):
+        # cProfile of the calling thread until stop_capture; other threads join
+        # in through capture_call
+        self.capture = [cProfile.Profile()]
+        self.capture[0].enable()
+
+    def capture_call(self, func, *args):
+        # Runs func, under its own cProfile while a capture is running. Used
+        # for work on other threads, which a profiler enabled on the UI thread
+        # does not see
+        capture = self.capture
+        if capture is None:
+            return func(*args)
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args)
+        finally:
+            capture.append(profile)
+
+    def stop_capture(self, path='profile.prof', limit=20):
+        # Ends the capture, writes it for pstats/snakeviz and returns the top
+        # functions by cumulative time as text
+        capture, self.capture = self.capture, None
+        if capture is None:
+            return ''
+        capture[0].disable()
+        stats = pstats.Stats(capture[0])
+        for profile in capture[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
+        text = io.StringIO()
+        stats.stream = text
+        stats.sort_stats('cumulative').print_stats(limit)
+        return text.getvalue()
+
+    @property
+    def capturing(self):
+        return self.capture is not None
+
+
+PROFILER = Profiler()
+for piece_class in (Piece, Pawn, Knight, Bishop, Rook, Queen, King):
+    PROFILER.register(piece_class, 'is_valid_move')
+for board_class in (Board, BitboardBoard):
+    PROFILER.register(board_class, 'is_in_check', 'would_be_in_check')
+PROFILER.register(GameController, 'cpu_move', 'choose_cpu_move', 'save_game_state',
+                  'add_game_result', 'update_game_record')
+PROFILER.register(GameStore, 'add', 'update')
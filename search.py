@@ -0,0 +1,282 @@
+import time
+
+from evaluation import evaluate
+from transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+
+MATE_SCORE = 100000
+INFINITY = 10 ** 9
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def evaluate_material(board):
+    # Material balance in centipawns from the point of view of the side to move
+    score = 0
+    for row in board.board:
+        for piece in row:
+            if piece:
+                value = piece.value * 100
+                score += value if piece.color == 'white' else -value
+    return score if board.current_turn == 'white' else -score
+
+
+def mvv_lva(board, move):
+    # Most valuable victim first, then least valuable attacker
+    victim = board.board[move[2]][move[3]]
+    if victim is None:
+        return 0
+    attacker = board.board[move[0]][move[1]]
+    return 100 * victim.value - (attacker.value or 10) + 1000
+
+
+def score_to_tt(score, ply):
+    # Mate scores are stored relative to the node, not the root
+    if score >= MATE_SCORE - 1000:
+        return score + ply
+    if score <= -MATE_SCORE + 1000:
+        return score - ply
+    return score
+
+
+def score_from_tt(score, ply):
+    if score >= MATE_SCORE - 1000:
+        return score - ply
+    if score <= -MATE_SCORE + 1000:
+        return score + ply
+    return score
+
+
+class Searcher:
+    def __init__(self, time_limit=0.1, max_nodes=None, max_depth=64, evaluate=evaluate,
+                 tt_size_mb=16):
+        # time_limit is in seconds; either budget may be None for no limit
+        self.time_limit = time_limit
+        self.max_nodes = max_nodes
+        # max_depth caps plies from the root, quiescence included; depth_limit
+        # stops iterative deepening early (UCI go depth) and may be None
+        self.max_depth = max_depth
+        self.depth_limit = None
+        self.evaluate = evaluate
+        # The table is allocated on first search so idle engines stay small
+        self.tt_size_mb = tt_size_mb
+        self.tt = None
+        self.stopped = False
+        # A multiprocessing.Event another process sets to stop this search,
+        # as stop() does within one process; polled every 64 nodes
+        self.stop_event = None
+        # Called with the searcher after every finished iteration, e.g. for UCI info lines
+        self.report = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.nodes = 0
+        self.depth = 0
+        self.best_move = None
+        self.best_score = 0
+        self.elapsed = 0.0
+
+    @property
+    def nps(self):
+        return int(self.nodes / self.elapsed) if self.elapsed > 0 else 0
+
+    def stats(self):
+        return {
+            'nodes': self.nodes,
+            'depth': self.depth,
+            'score': self.best_score,
+            'time': self.elapsed,
+            'nps': self.nps,
+            'hashfull': self.tt.usage() if self.tt else 0
+        }
+
+    def stop(self):
+        # Safe to call from another thread; the search unwinds within a node
+        self.stopped = True
+
+    def search(self, board, root_moves=None):
+        # Iterative deepening; returns the best move of the last finished iteration.
+        # root_moves restricts the search to a subset, as used by parallel search
+        self.reset_stats()
+        self.stopped = False
+        self.start_time = time.perf_counter()
+        self.killers = [[None, None] for _ in range(self.max_depth + 1)]
+        self.history = {}
+        if self.tt is None:
+            self.tt = TranspositionTable(self.tt_size_mb)
+        self.tt.new_search()
+
+        if root_moves is None:
+            root_moves = board.generate_legal_moves(board.current_turn)
+        # Captures first, so even an unfinished first iteration has looked at
+        # the likeliest good moves
+        root_moves = sorted(root_moves, key=lambda move: mvv_lva(board, move), reverse=True)
+        if not root_moves:
+            return None
+        self.best_move = root_moves[0]
+
+        try:
+            last = min(self.depth_limit or self.max_depth, self.max_depth)
+            for depth in range(1, last + 1):
+                score, move = self._search_root(board, root_moves, depth)
+                self.best_move, self.best_score, self.depth = move, score, depth
+                if self.report:
+                    self.elapsed = self._elapsed()
+                    self.report(self)
+                # Search the previous best move first next iteration
+                root_moves.remove(move)
+                root_moves.insert(0, move)
+                if abs(score) >= MATE_SCORE - self.max_depth:
+                    break
+                if self.time_limit is not None and self._elapsed() * 2 > self.time_limit:
+                    break
+        except SearchTimeout:
+            # The board is restored by the unwinding unmake_move calls
+            pass
+
+        self.elapsed = self._elapsed()
+        return self.best_move
+
+    def _elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def _check_budget(self):
+        if self.stopped:
+            raise SearchTimeout()
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            raise SearchTimeout()
+        if self.nodes & 63 == 0:
+            if self.time_limit is not None and self._elapsed() >= self.time_limit:
+                raise SearchTimeout()
+            if self.stop_event is not None and self.stop_event.is_set():
+                raise SearchTimeout()
+
+    def _search_root(self, board, moves, depth):
+        alpha, beta = -INFINITY, INFINITY
+        best_move = moves[0]
+        for move in moves:
+            board.make_move(move)
+            try:
+                score = -self._negamax(board, depth - 1, -beta, -alpha, 1)
+            finally:
+                board.unmake_move()
+            if score > alpha:
+                alpha, best_move = score, move
+                # Kept as it improves, so a timeout mid-iteration still plays
+                # the best move searched so far; the previous best is tried first
+                if depth == 1 or move != moves[0]:
+                    self.best_move, self.best_score = move, score
+        return alpha, best_move
+
+    def _order_moves(self, board, moves, ply, tt_move=None):
+        killers = self.killers[ply]
+        color = board.current_turn
+
+        def key(move):
+            if move == tt_move:
+                return INFINITY
+            capture = mvv_lva(board, move)
+            if capture:
+                return capture
+            if move == killers[0]:
+                return 900
+            if move == killers[1]:
+                return 800
+            return min(self.history.get((color, move), 0), 700)
+
+        moves.sort(key=key, reverse=True)
+        return moves
+
+    def _negamax(self, board, depth, alpha, beta, ply):
+        self.nodes += 1
+        self._check_budget()
+
+        if board.repetition_count():
+            return 0
+
+        original_alpha = alpha
+        tt_move = None
+        entry = self.tt.probe(board.hash)
+        if entry:
+            tt_depth, tt_score, flag, tt_move = entry
+            if tt_depth >= depth:
+                tt_score = score_from_tt(tt_score, ply)
+                if (flag == EXACT or (flag == LOWER_BOUND and tt_score >= beta) or
+                        (flag == UPPER_BOUND and tt_score <= alpha)):
+                    return tt_score
+
+        # Leaves go straight to quiescence, which generates the moves once
+        # and scores mate and stalemate itself
+        if depth <= 0 or ply >= self.max_depth:
+            return self._quiescence(board, alpha, beta, ply, horizon=True)
+        color = board.current_turn
+        moves = board.generate_legal_moves(color)
+        if not moves:
+            # Checkmate or stalemate; prefer the quickest mate
+            return -MATE_SCORE + ply if board.is_in_check(color) else 0
+
+        best_move = None
+        for move in self._order_moves(board, moves, ply, tt_move):
+            is_capture = board.board[move[2]][move[3]] is not None
+            board.make_move(move)
+            try:
+                score = -self._negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                board.unmake_move()
+
+            if score >= beta:
+                if not is_capture:
+                    killers = self.killers[ply]
+                    if killers[0] != move:
+                        killers[1] = killers[0]
+                        killers[0] = move
+                    self.history[(color, move)] = self.history.get((color, move), 0) + depth * depth
+                self.tt.store(board.hash, depth, score_to_tt(beta, ply), LOWER_BOUND, move)
+                return beta
+            if score > alpha:
+                alpha, best_move = score, move
+
+        flag = EXACT if alpha > original_alpha else UPPER_BOUND
+        self.tt.store(board.hash, depth, score_to_tt(alpha, ply), flag, best_move)
+        return alpha
+
+    def _quiescence(self, board, alpha, beta, ply, horizon=False):
+        # Only captures are searched so the leaf score is not taken mid-exchange.
+        # At the horizon one legal move list serves both the mate and stalemate
+        # test and the captures; deeper, moves are only generated past stand pat
+        self.nodes += 1
+        self._check_budget()
+
+        color = board.current_turn
+        moves = None
+        if horizon:
+            moves = board.generate_legal_moves(color)
+            if not moves:
+                return -MATE_SCORE + ply if board.is_in_check(color) else 0
+
+        stand_pat = self.evaluate(board)
+        if stand_pat >= beta:
+            return beta
+        if stand_pat > alpha:
+            alpha = stand_pat
+        if ply >= self.max_depth:
+            return alpha
+
+        if moves is None:
+            captures = board.generate_captures(color)
+        else:
+            squares = board.board
+            captures = [move for move in moves if squares[move[2]][move[3]] is not None]
+        captures.sort(key=lambda move: mvv_lva(board, move), reverse=True)
+        for move in captures:
+            board.make_move(move)
+            try:
+                score = -self._quiescence(board, -beta, -alpha, ply + 1)
+            finally:
+                board.unmake_move()
+            if score >= beta:
+                return beta
+            if score > alpha:
+                alpha = score
+        return alpha
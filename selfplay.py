@@ -0,0 +1,104 @@
+import argparse
+import json
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from engine import GameController
+
+# One controller per worker process, reused for every game it plays
+_controller = None
+
+
+def _init_worker(think_time, max_nodes):
+    global _controller
+    # Records go back to the parent, so workers open no score store
+    _controller = GameController(think_time=think_time, scores_path=None)
+    _controller.searcher.max_nodes = max_nodes
+
+
+def play_game(game_id, max_plies=200, random_plies=4, seed=None):
+    # Plays one engine-vs-engine game and returns an add_game_result style record
+    # with the ending reason and ply count added
+    controller = _controller
+    controller.reset_game()
+    controller.game_id = game_id
+    board = controller.board
+    rng = random.Random(game_id if seed is None else seed)
+
+    plies = 0
+    winner, reason = 'draw', 'move cap'
+    while plies < max_plies:
+        result = controller.game_result()
+        if result:
+            winner, reason = result
+            break
+        if board.repetition_count() >= 2:
+            reason = 'repetition'
+            break
+        # A few random opening plies keep the games from all being identical
+        if plies < random_plies:
+            controller.move_piece(*rng.choice(board.generate_legal_moves(board.current_turn)))
+        else:
+            controller.cpu_move()
+        plies += 1
+
+    record = controller.build_game_record(winner, controller.game_history)
+    record['result'] = reason
+    record['plies'] = plies
+    return record
+
+
+def run_tournament(games, output, workers=None, think_time=0.05, max_nodes=None,
+                   max_plies=200, random_plies=4):
+    # Results are appended to output as JSON lines as soon as each game finishes
+    start = time.perf_counter()
+    summary = {'white': 0, 'black': 0, 'draw': 0}
+    reasons = {}
+    total_plies = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(think_time, max_nodes)) as pool, open(output, 'a') as f:
+        futures = [pool.submit(play_game, game_id, max_plies, random_plies) for game_id in range(games)]
+        for future in as_completed(futures):
+            record = future.result()
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            summary[record['winner']] += 1
+            reasons[record['result']] = reasons.get(record['result'], 0) + 1
+            total_plies += record['plies']
+
+    elapsed = time.perf_counter() - start
+    return {
+        'games': games,
+        'time': elapsed,
+        'games_per_sec': games / elapsed if elapsed > 0 else 0,
+        'average_plies': total_plies / games if games else 0,
+        'win_rates': {key: count / games for key, count in summary.items()} if games else {},
+        'endings': reasons
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play engine-vs-engine games across all cores')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None, help='defaults to the number of cores')
+    parser.add_argument('--think-time', type=float, default=0.05, help='seconds per move')
+    parser.add_argument('--nodes', type=int, default=None, help='node budget per move')
+    parser.add_argument('--max-plies', type=int, default=200)
+    parser.add_argument('--random-plies', type=int, default=4)
+    parser.add_argument('--output', default='selfplay.jsonl')
+    args = parser.parse_args(argv)
+
+    think_time = None if args.nodes else args.think_time
+    report = run_tournament(args.games, args.output, args.workers, think_time, args.nodes,
+                            args.max_plies, args.random_plies)
+    print(f"{report['games']} games in {report['time']:.1f}s ({report['games_per_sec']:.2f} games/s)")
+    print(f"Average length: {report['average_plies']:.1f} plies")
+    for side, rate in report['win_rates'].items():
+        print(f"{side}: {rate:.1%}")
+    for reason, count in report['endings'].items():
+        print(f"{reason}: {count}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+import argparse
+import asyncio
+import json
+import os
+import resource
+import signal
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from board import Board, move_to_uci, uci_to_move
+from book import OpeningBook
+from codec import encode, decode
+from engine import board_result, choose_move
+from search import Searcher
+from storage import SessionStore
+from tablebase import Tablebases
+
+# Many games from one process. The protocol is newline-delimited JSON over
+# TCP, and every request names its session so one connection can carry any
+# number of games:
+#   {"cmd": "new"}                                 -> {"session": 7, "legal": ["a2a3", ...]}
+#   {"cmd": "move", "session": 7, "move": "e2e4"}  -> {"move": "e7e5", "legal": [...], "result": null}
+#   {"cmd": "end", "session": 7}                   -> {"ended": 7}
+#   {"cmd": "stats"}                               -> {"sessions": ..., "moves": ..., "rss": ...}
+# The human side plays white. Failures answer {"error": "..."}, and an "id"
+# field in a request is copied into its response so clients can pipeline.
+
+# Per pool process CPU player, set up once by _init_worker
+_worker = None
+
+
+def _init_worker(think_time, max_nodes, book_path, tablebase_dir):
+    global _worker
+    # The book and tablebases are memory-mapped, so every worker shares one copy
+    _worker = (Searcher(time_limit=think_time, max_nodes=max_nodes, tt_size_mb=4),
+               OpeningBook.open(book_path), Tablebases.open(tablebase_dir))
+
+
+def _cpu_reply(position):
+    # Runs in a pool process; the board travels as its 41-byte encoding
+    searcher, book, tablebases = _worker
+    return choose_move(decode(position), searcher, book, tablebases)
+
+
+def resident_memory():
+    # Resident set size in bytes; peak RSS where /proc is not available
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def legal_moves(board):
+    return [move_to_uci(move) for move in board.generate_legal_moves(board.current_turn)]
+
+
+class Session:
+    # The board is kept in its 41-byte encoding and decoded per request
+    __slots__ = ('position', 'plies', 'result', 'busy')
+
+    def __init__(self, position, plies=0, result=None):
+        self.position = position
+        self.plies = plies
+        self.result = result
+        self.busy = False
+
+
+class RequestError(Exception):
+    pass
+
+
+class GameServer:
+    def __init__(self, workers=None, think_time=0.05, max_nodes=None, store_path='sessions.db',
+                 flush_interval=1.0, book_path='book.bin', tablebase_dir='tablebases'):
+        self.sessions = {}
+        # Sessions changed since the last flush
+        self.dirty = set()
+        self.flush_interval = flush_interval
+        self.store = SessionStore(store_path)
+        self.next_id = self.store.next_session_id()
+        # CPU replies run in other processes so they never block the event loop;
+        # SQLite writes get one thread of their own
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                        initargs=(think_time, max_nodes, book_path, tablebase_dir))
+        self.io = ThreadPoolExecutor(max_workers=1)
+        self.server = None
+        self.flusher = None
+        # Connection handler tasks and their writers, ended by close()
+        self.clients = {}
+        self.moves = 0
+
+    async def start(self, host='127.0.0.1', port=8765):
+        # Returns the port, useful with port=0
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        self.flusher = asyncio.create_task(self._flush_loop())
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        for writer in self.clients.values():
+            writer.close()
+        if self.clients:
+            await asyncio.wait(list(self.clients))
+        self.flusher.cancel()
+        await self.flush()
+        self.pool.shutdown(cancel_futures=True)
+        self.io.shutdown()
+        self.store.close()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        # Writes every changed session in one transaction; returns how many
+        if not self.dirty:
+            return 0
+        rows = []
+        for session_id in self.dirty:
+            session = self.sessions.get(session_id)
+            if session:
+                rows.append((session_id, session.position, session.plies,
+                             json.dumps(session.result) if session.result else None))
+        self.dirty = set()
+        await asyncio.get_running_loop().run_in_executor(self.io, self.store.save_many, rows)
+        return len(rows)
+
+    async def handle_client(self, reader, writer):
+        # Requests are served concurrently, so a slow CPU reply in one session
+        # does not hold up the others sharing the connection
+        tasks = set()
+        self.clients[asyncio.current_task()] = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.create_task(self._respond(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        except ConnectionError:
+            pass
+        finally:
+            del self.clients[asyncio.current_task()]
+            writer.close()
+
+    async def _respond(self, line, writer):
+        request = {}
+        try:
+            request = json.loads(line)
+            response = await self.dispatch(request)
+        except (RequestError, ValueError, KeyError, TypeError) as e:
+            response = {'error': str(e)}
+        if 'id' in request:
+            response['id'] = request['id']
+        writer.write(json.dumps(response).encode() + b'\n')
+        await writer.drain()
+
+    async def dispatch(self, request):
+        command = request.get('cmd')
+        if command == 'new':
+            return self.new_session()
+        if command == 'move':
+            return await self.play(request['session'], request['move'])
+        if command == 'end':
+            return await self.end_session(request['session'])
+        if command == 'stats':
+            return {'sessions': len(self.sessions), 'moves': self.moves, 'rss': resident_memory()}
+        raise RequestError(f"unknown command {command!r}")
+
+    def new_session(self):
+        board = Board()
+        board.setup_pieces()
+        session_id = self.next_id
+        self.next_id += 1
+        self.sessions[session_id] = Session(encode(board))
+        self.dirty.add(session_id)
+        return {'session': session_id, 'legal': legal_moves(board)}
+
+    async def _session(self, session_id):
+        # Sessions not in memory, e.g. after a restart, come back from the store
+        session = self.sessions.get(session_id)
+        if session is None:
+            row = await asyncio.get_running_loop().run_in_executor(self.io, self.store.load, session_id)
+            if row is None:
+                raise RequestError(f"no session {session_id}")
+            position, plies, result = row
+            session = self.sessions.setdefault(session_id, Session(position, plies,
+                                                                   json.loads(result) if result else None))
+        return session
+
+    async def end_session(self, session_id):
+        # Saves the session and drops it from memory. Not while the CPU is
+        # thinking: the reply would land after the flush and never be saved
+        session = await self._session(session_id)
+        if session.busy:
+            raise RequestError('the CPU is still thinking')
+        await self.flush()
+        # A move may have started while the flush ran
+        if session.busy:
+            raise RequestError('the CPU is still thinking')
+        self.sessions.pop(session_id, None)
+        return {'ended': session_id}
+
+    async def play(self, session_id, text):
+        # Plays the human move, then the CPU's reply
+        session = await self._session(session_id)
+        if session.busy:
+            raise RequestError('the CPU is still thinking')
+        if session.result:
+            raise RequestError('the game is over')
+        board = decode(session.position)
+        if board.current_turn != 'white':
+            raise RequestError('not your turn')
+        try:
+            move = uci_to_move(text)
+        except (ValueError, IndexError):
+            raise RequestError(f"bad move {text!r}")
+        if not board.move_piece(*move):
+            raise RequestError(f"illegal move {text}")
+        session.position = encode(board)
+        session.plies += 1
+        self.moves += 1
+        self.dirty.add(session_id)
+
+        reply = None
+        result = board_result(board)
+        if not result:
+            session.busy = True
+            try:
+                reply = await asyncio.get_running_loop().run_in_executor(self.pool, _cpu_reply,
+                                                                         session.position)
+            finally:
+                session.busy = False
+            board.make_move(reply)
+            session.position = encode(board)
+            session.plies += 1
+            self.moves += 1
+            result = board_result(board)
+        session.result = result
+        # Again, for the reply: a flush may have run while the CPU was thinking
+        self.dirty.add(session_id)
+        return {'move': move_to_uci(reply) if reply else None,
+                'legal': [] if result else legal_moves(board), 'result': result}
+
+
+async def serve(args):
+    server = GameServer(args.workers, args.think_time, args.nodes, args.store, args.flush_interval)
+    port = await server.start(args.host, args.port)
+    print(f"Serving on {args.host}:{port}", flush=True)
+    # Stop cleanly on SIGTERM too, so the last batch of sessions is saved
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+    try:
+        await stopping.wait()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Host many games over newline-delimited JSON on TCP')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=None, help='CPU reply processes')
+    parser.add_argument('--think-time', type=float, default=0.05, help='seconds per CPU reply')
+    parser.add_argument('--nodes', type=int, default=None, help='node budget per CPU reply')
+    parser.add_argument('--store', default='sessions.db')
+    parser.add_argument('--flush-interval', type=float, default=1.0, help='seconds between batched saves')
+    asyncio.run(serve(parser.parse_args(argv)))
+
+
+if __name__ == '__main__':
+    main()
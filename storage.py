@@ -0,0 +1,146 @@
+import json
+import sqlite3
+import sys
+
+# Columns in the order of the add_game_result record
+FIELDS = ('game_id', 'date', 'winner', 'white_score', 'black_score', 'moves', 'total_moves')
+# Also written, but only read back through move_logs: the scoreboard has no use for it
+COLUMNS = FIELDS + ('move_log',)
+
+
+class GameStore:
+    """Game records in SQLite, keyed by game_id, so inserts, lookups, updates
+    and deletes touch one row instead of rewriting every stored game."""
+
+    def __init__(self, path='scores.db'):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS games ('
+            'game_id INTEGER PRIMARY KEY, date TEXT, winner TEXT, '
+            'white_score INTEGER, black_score INTEGER, moves TEXT, total_moves INTEGER, move_log TEXT)'
+        )
+        # Stores from before move logs were saved gain the column
+        if 'move_log' not in [row[1] for row in self.conn.execute('PRAGMA table_info(games)')]:
+            self.conn.execute('ALTER TABLE games ADD COLUMN move_log TEXT')
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def _row_to_record(self, row):
+        record = dict(zip(FIELDS, row))
+        record['moves'] = json.loads(record['moves'])
+        return record
+
+    def _record_to_row(self, record):
+        row = dict(record)
+        row['moves'] = json.dumps(record.get('moves', []))
+        row.setdefault('total_moves', len(record.get('moves', [])))
+        if row.get('move_log') is not None:
+            row['move_log'] = json.dumps(row['move_log'])
+        return tuple(row.get(field) for field in COLUMNS)
+
+    def add(self, record):
+        # Saving the same game twice keeps the latest copy
+        self.conn.execute(f'INSERT OR REPLACE INTO games ({", ".join(COLUMNS)}) '
+                          f'VALUES ({", ".join("?" * len(COLUMNS))})',
+                          self._record_to_row(record))
+        self.conn.commit()
+
+    def get(self, game_id):
+        row = self.conn.execute(f'SELECT {", ".join(FIELDS)} FROM games WHERE game_id = ?',
+                                (game_id,)).fetchone()
+        return self._row_to_record(row) if row else None
+
+    def update(self, game_id, fields):
+        # Returns False if there is no such game
+        fields = dict(fields)
+        for name in ('moves', 'move_log'):
+            if name in fields:
+                fields[name] = json.dumps(fields[name])
+        columns = ', '.join(f'{name} = ?' for name in fields)
+        cursor = self.conn.execute(f'UPDATE games SET {columns} WHERE game_id = ?',
+                                   (*fields.values(), game_id))
+        self.conn.commit()
+        return cursor.rowcount > 0
+
+    def delete(self, game_id):
+        cursor = self.conn.execute('DELETE FROM games WHERE game_id = ?', (game_id,))
+        self.conn.commit()
+        return cursor.rowcount > 0
+
+    def next_game_id(self):
+        # MAX on the primary key is answered from the index
+        (max_id,) = self.conn.execute('SELECT MAX(game_id) FROM games').fetchone()
+        return 0 if max_id is None else max_id + 1
+
+    def count(self):
+        (total,) = self.conn.execute('SELECT COUNT(*) FROM games').fetchone()
+        return total
+
+    def recent(self, limit=5, offset=0):
+        # Newest games first; offset pages further back
+        rows = self.conn.execute(f'SELECT {", ".join(FIELDS)} FROM games '
+                                 'ORDER BY game_id DESC LIMIT ? OFFSET ?', (limit, offset))
+        return [self._row_to_record(row) for row in rows]
+
+    def move_logs(self):
+        # The movelog.MoveLog.to_dict of every game saved with one, oldest first
+        rows = self.conn.execute('SELECT move_log FROM games WHERE move_log IS NOT NULL ORDER BY game_id')
+        for (move_log,) in rows:
+            yield json.loads(move_log)
+
+    def migrate_from_json(self, json_path='scores.json'):
+        # One-shot import of the old scores.json list; returns the number of records
+        try:
+            with open(json_path, 'r') as f:
+                records = json.load(f)
+        except FileNotFoundError:
+            return 0
+        with self.conn:
+            self.conn.executemany(f'INSERT OR REPLACE INTO games ({", ".join(COLUMNS)}) '
+                                  f'VALUES ({", ".join("?" * len(COLUMNS))})',
+                                  [self._record_to_row(record) for record in records])
+        return len(records)
+
+
+class SessionStore:
+    """Latest position of every server session, written in batches by
+    server.GameServer rather than once per move."""
+
+    def __init__(self, path='sessions.db'):
+        self.path = path
+        # Flushes run on the server's persistence thread
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            'session_id INTEGER PRIMARY KEY, position BLOB, plies INTEGER, result TEXT)'
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def save_many(self, rows):
+        # rows are (session_id, position, plies, result), all in one transaction
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)', rows)
+
+    def load(self, session_id):
+        # (position, plies, result) or None
+        return self.conn.execute('SELECT position, plies, result FROM sessions WHERE session_id = ?',
+                                 (session_id,)).fetchone()
+
+    def next_session_id(self):
+        (max_id,) = self.conn.execute('SELECT MAX(session_id) FROM sessions').fetchone()
+        return 0 if max_id is None else max_id + 1
+
+
+if __name__ == '__main__':
+    # python storage.py [scores.json] [scores.db]
+    json_path = sys.argv[1] if len(sys.argv) > 1 else 'scores.json'
+    db_path = sys.argv[2] if len(sys.argv) > 2 else 'scores.db'
+    store = GameStore(db_path)
+    print(f"Migrated {store.migrate_from_json(json_path)} games from {json_path} to {db_path}")
+    store.close()
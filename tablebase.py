@@ -0,0 +1,319 @@
+import argparse
+import mmap
+import os
+import struct
+import time
+from array import array
+
+from board import Board
+from pieces import Pawn, Knight, Bishop, Rook, Queen, King, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+
+# Distance-to-mate tables for king and up to two pieces against a lone king,
+# built offline by retrograde analysis on Board's own move rules and
+# memory-mapped at runtime. Tables are stored from the point of view of the
+# stronger side playing white; positions where black is stronger are probed
+# with colours swapped and the board mirrored.
+
+MAGIC = b'CHESSTB1'
+HEADER = struct.Struct('<8sQ')
+
+# The stronger side's pieces besides its king, in index order
+TABLES = {
+    'KQK': (QUEEN,),
+    'KRK': (ROOK,),
+    'KPK': (PAWN,),
+    'KBNK': (BISHOP, KNIGHT),
+}
+# KPK promotes into KQK, so KQK has to be built first
+DEFAULT_TABLES = ('KQK', 'KRK', 'KPK')
+LETTERS = {QUEEN: 'Q', ROOK: 'R', BISHOP: 'B', KNIGHT: 'N', PAWN: 'P'}
+CLASSES = {PAWN: Pawn, KNIGHT: Knight, BISHOP: Bishop, ROOK: Rook, QUEEN: Queen, KING: King}
+
+# Entry values: 0 is a draw, 255 an impossible position, anything else is a
+# win for the stronger side with the mate (value - 1) plies away
+DRAW = 0
+ILLEGAL = 255
+WHITE_TO_MOVE, BLACK_TO_MOVE = 0, 1
+
+# Without pawns every position has a mirror image with the white king in this
+# ten-square triangle (a1-d1-d4); with a pawn only the left-right mirror
+# applies, so the pawn is kept on files a-d instead. Squares are row * 8 + col.
+TRIANGLE = [row * 8 + col for row in range(4, 8) for col in range(4) if 7 - row <= col]
+PAWN_SQUARES = [row * 8 + col for row in range(1, 7) for col in range(4)]
+
+
+def _flip_diagonal(square):
+    row, col = divmod(square, 8)
+    return (7 - col) * 8 + (7 - row)
+
+
+class Layout:
+    """Perfect-hash index of one material set: side to move, the symmetry
+    anchor (white king, or the pawn) and then every other square."""
+
+    def __init__(self, name):
+        self.name = name
+        self.kinds = TABLES[name]
+        self.pawns = PAWN in self.kinds
+        self.anchors = PAWN_SQUARES if self.pawns else TRIANGLE
+        self.anchor_index = {square: i for i, square in enumerate(self.anchors)}
+        # Squares in index order: white king, black king, then the stronger pieces
+        self.count = 2 + len(self.kinds)
+        self.side_size = len(self.anchors) * 64 ** (self.count - 1)
+        self.size = 2 * self.side_size
+
+    def canonical(self, squares):
+        if self.pawns:
+            if squares[2] & 7 > 3:
+                squares = [square ^ 7 for square in squares]
+            return squares
+        if squares[0] & 7 > 3:
+            squares = [square ^ 7 for square in squares]
+        if squares[0] >> 3 < 4:
+            squares = [square ^ 56 for square in squares]
+        row, col = divmod(squares[0], 8)
+        if 7 - row > col:
+            squares = [_flip_diagonal(square) for square in squares]
+        return squares
+
+    def index(self, side, squares):
+        squares = self.canonical(squares)
+        anchor = 2 if self.pawns else 0
+        index = self.anchor_index[squares[anchor]]
+        for i, square in enumerate(squares):
+            if i != anchor:
+                index = index * 64 + square
+        return side * self.side_size + index
+
+    def squares(self, index):
+        # (side, squares) for an index; the inverse of index() on canonical squares
+        side, index = divmod(index, self.side_size)
+        rest = []
+        for _ in range(self.count - 1):
+            index, square = divmod(index, 64)
+            rest.append(square)
+        rest.reverse()
+        anchor = self.anchors[index]
+        if self.pawns:
+            return side, rest[:2] + [anchor] + rest[2:]
+        return side, [anchor] + rest
+
+
+def _setup(layout, squares):
+    board = Board()
+    pieces = [King('white'), King('black')] + [CLASSES[kind]('white') for kind in layout.kinds]
+    for piece, square in zip(pieces, squares):
+        row, col = divmod(square, 8)
+        if piece.kind == PAWN:
+            piece.has_moved = row != 6
+        board.place_piece(row, col, piece)
+    return board
+
+
+def generate(name, tables=None):
+    # Returns (bytearray of entries, stats). tables maps already generated
+    # names to entries, for positions this table converts into (KPK -> KQK)
+    tables = tables or {}
+    layout = Layout(name)
+    size = layout.size
+    values = bytearray([ILLEGAL]) * size
+    # Legal moves left that do not lose, for black-to-move positions
+    counters = array('H', [0]) * size
+    # In-table successors as a flat list, positions [offsets[i], offsets[i + 1])
+    offsets = array('l', [0])
+    successors = array('l')
+    buckets = {}
+    king_steps = {(a, b) for a in range(64) for b in range(64)
+                  if max(abs((a >> 3) - (b >> 3)), abs((a & 7) - (b & 7))) <= 1}
+
+    promotion = Layout('KQK') if layout.pawns else None
+    for index in range(size):
+        side, squares = layout.squares(index)
+        if len(set(squares)) == layout.count and (squares[0], squares[1]) not in king_steps:
+            board = _setup(layout, squares)
+            color = 'white' if side == WHITE_TO_MOVE else 'black'
+            if side == BLACK_TO_MOVE:
+                board.current_turn = 'black'
+            if not board.is_in_check('black' if color == 'white' else 'white'):
+                values[index] = DRAW
+                moves = board.generate_legal_moves(color)
+                for start_x, start_y, end_x, end_y in moves:
+                    start, end = start_x * 8 + start_y, end_x * 8 + end_y
+                    if end in squares:
+                        # Only the lone king can capture; what is left is a draw
+                        continue
+                    moved = squares.index(start)
+                    after = squares[:moved] + [end] + squares[moved + 1:]
+                    if moved == 2 and layout.pawns and end_x == 0:
+                        # Promotion leaves this table; the KQK entry decides it
+                        entry = tables['KQK'][promotion.index(BLACK_TO_MOVE, after)]
+                        if entry not in (DRAW, ILLEGAL):
+                            buckets.setdefault(entry, []).append(index)
+                        continue
+                    successors.append(layout.index(1 - side, after))
+                if side == BLACK_TO_MOVE:
+                    counters[index] = len(moves)
+                    if not moves and board.is_in_check(color):
+                        buckets.setdefault(0, []).append(index)
+        offsets.append(len(successors))
+
+    # Reverse the successor lists so each decided position can reach its predecessors
+    starts = array('l', [0]) * (size + 1)
+    for successor in successors:
+        starts[successor + 1] += 1
+    for index in range(size):
+        starts[index + 1] += starts[index]
+    fill = array('l', starts)
+    predecessors = array('l', [0]) * len(successors)
+    for index in range(size):
+        for position in range(offsets[index], offsets[index + 1]):
+            successor = successors[position]
+            predecessors[fill[successor]] = index
+            fill[successor] += 1
+    del successors, offsets, fill
+
+    # Decide positions in order of distance to mate: a white-to-move position
+    # wins as soon as one move reaches a lost position, a black-to-move one is
+    # lost once every move has reached a won position
+    plies = 0
+    while plies < ILLEGAL - 2 and any(key >= plies for key in buckets):
+        for index in buckets.pop(plies, ()):
+            if values[index] != DRAW:
+                continue
+            values[index] = plies + 1
+            black_lost = index >= layout.side_size
+            for position in range(starts[index], starts[index + 1]):
+                previous = predecessors[position]
+                if values[previous] != DRAW:
+                    continue
+                if not black_lost:
+                    # previous is black to move and has one fewer way out
+                    counters[previous] -= 1
+                    if counters[previous]:
+                        continue
+                buckets.setdefault(plies + 1, []).append(previous)
+        plies += 1
+
+    stats = {'positions': size, 'legal': size - values.count(ILLEGAL),
+             'wins': sum(1 for value in values if value not in (DRAW, ILLEGAL)),
+             'longest': max((value - 1 for value in values if value != ILLEGAL), default=0)}
+    return values, stats
+
+
+def save(values, path):
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(values)))
+        f.write(values)
+
+
+class Tablebases:
+    """Memory-mapped tables from one directory, probed by material."""
+
+    def __init__(self, directory='tablebases'):
+        self.directory = directory
+        self.tables = {}
+        for name in TABLES:
+            path = os.path.join(directory, name + '.bin')
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                table = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, size = HEADER.unpack_from(table)
+            layout = Layout(name)
+            if magic != MAGIC or size != layout.size:
+                table.close()
+                raise ValueError(f"{path} is not a {name} table")
+            self.tables[name] = (layout, table)
+
+    @classmethod
+    def open(cls, directory='tablebases'):
+        # None when the directory holds no tables
+        tablebases = cls(directory) if os.path.isdir(directory) else None
+        return tablebases if tablebases and tablebases.tables else None
+
+    def close(self):
+        for _, table in self.tables.values():
+            table.close()
+
+    def probe(self, board):
+        # (outcome, plies) for the side to move: outcome 1 wins, -1 loses and
+        # 0 draws, with mate plies away. None if no table covers the position
+        found = {'white': [], 'black': []}
+        for row in range(8):
+            for col in range(8):
+                piece = board.board[row][col]
+                if piece:
+                    found[piece.color].append((piece.kind, row * 8 + col))
+        if len(found['white']) > 1 and len(found['black']) > 1:
+            return None
+        strong = 'white' if len(found['white']) >= len(found['black']) else 'black'
+        weak = 'black' if strong == 'white' else 'white'
+        if len(found[strong]) == 1:
+            return 0, 0
+        # Queen, rook, bishop, knight, pawn: the order of the table names
+        pieces = sorted(((kind, square) for kind, square in found[strong] if kind != KING), reverse=True)
+        name = 'K' + ''.join(LETTERS[kind] for kind, _ in pieces) + 'K'
+        if name not in self.tables:
+            return None
+        layout, table = self.tables[name]
+        kings = {color: next(square for kind, square in found[color] if kind == KING)
+                 for color in found}
+        squares = [kings[strong], kings[weak]] + [square for _, square in pieces]
+        if strong == 'black':
+            # Swap colours by mirroring the board top to bottom
+            squares = [square ^ 56 for square in squares]
+        strong_to_move = board.current_turn == strong
+        value = table[HEADER.size + layout.index(WHITE_TO_MOVE if strong_to_move else BLACK_TO_MOVE,
+                                                 squares)]
+        if value == DRAW or value == ILLEGAL:
+            return 0, 0
+        return (1 if strong_to_move else -1), value - 1
+
+    def best_move(self, board):
+        # The move that mates fastest when winning, holds the draw when
+        # drawn and delays mate longest when lost; None if not covered
+        if self.probe(board) is None:
+            return None
+        best, best_key = None, None
+        for move in board.generate_legal_moves(board.current_turn):
+            board.make_move(move)
+            # Captures can leave the tables (e.g. KBNK to KNK); those are draws
+            outcome, plies = self.probe(board) or (0, 0)
+            board.unmake_move()
+            # outcome is the opponent's: their losses first, quickest mate first,
+            # then draws, then their wins with the mate furthest away
+            key = (outcome, plies if outcome < 0 else -plies)
+            if best_key is None or key < best_key:
+                best, best_key = move, key
+        return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate endgame tablebases by retrograde analysis')
+    parser.add_argument('--tables', nargs='+', default=list(DEFAULT_TABLES), choices=list(TABLES))
+    parser.add_argument('--directory', default='tablebases')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.directory, exist_ok=True)
+    generated = {}
+    for name in args.tables:
+        if PAWN in TABLES[name] and 'KQK' not in generated:
+            path = os.path.join(args.directory, 'KQK.bin')
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    generated['KQK'] = f.read()[HEADER.size:]
+            else:
+                generated['KQK'], _ = generate('KQK')
+        start = time.perf_counter()
+        values, stats = generate(name, generated)
+        elapsed = time.perf_counter() - start
+        generated[name] = values
+        path = os.path.join(args.directory, name + '.bin')
+        save(values, path)
+        print(f"{name:5} {elapsed:7.1f}s {os.path.getsize(path):>9} bytes "
+              f"{stats['legal']:>8} legal positions {stats['wins']:>8} wins "
+              f"longest mate {stats['longest']} plies")
+
+
+if __name__ == '__main__':
+    main()
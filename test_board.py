@@ -0,0 +1,95 @@
+import json
+import os
+import random
+
+import pytest
+
+from bitboard import BitboardBoard
+from board import Board
+from codec import encode, decode, encode_text, decode_text, from_fen, to_fen
+from movelog import MoveLog
+from perft import POSITIONS, perft
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perft_baseline.json')
+
+
+def random_game(board, plies, seed):
+    # Plays up to plies random legal moves; returns [(move, captured piece), ...]
+    rng = random.Random(seed)
+    played = []
+    for _ in range(plies):
+        moves = board.generate_legal_moves(board.current_turn)
+        if not moves:
+            break
+        move = rng.choice(moves)
+        captured = board.board[move[2]][move[3]]
+        board.make_move(move)
+        played.append((move, captured))
+    return played
+
+
+@pytest.mark.parametrize('board_class', [Board, BitboardBoard])
+@pytest.mark.parametrize('name', list(POSITIONS))
+def test_perft_matches_baseline(name, board_class):
+    with open(BASELINE) as f:
+        baseline = json.load(f)
+    for depth, expected in baseline[name].items():
+        assert perft(from_fen(POSITIONS[name], board_class), int(depth)) == expected['nodes']
+
+
+@pytest.mark.parametrize('name', list(POSITIONS))
+def test_codec_round_trips(name):
+    board = from_fen(POSITIONS[name])
+    random_game(board, 30, seed=len(name))
+    data = encode(board)
+    copy = decode(data)
+    assert encode(copy) == data
+    assert copy.hash == board.hash
+    assert to_fen(copy) == to_fen(board)
+    assert encode(decode_text(encode_text(board))) == data
+    assert encode(decode(data, BitboardBoard)) == data
+    # FEN keeps the squares and side to move, not the has_moved flags
+    assert to_fen(from_fen(to_fen(board))) == to_fen(board)
+    assert from_fen(to_fen(board)).hash == board.hash
+
+
+def test_movelog_seek_and_truncate_match_replay():
+    board = Board()
+    board.setup_pieces()
+    played = random_game(board, 60, seed=7)
+    # A short interval so the game spans several checkpoints
+    board = Board()
+    board.setup_pieces()
+    log = MoveLog.from_board(board, interval=8)
+    for move, captured in played:
+        board.make_move(move)
+        log.append(board, move, captured)
+
+    def replayed(plies):
+        board = Board()
+        board.setup_pieces()
+        for move, _ in played[:plies]:
+            board.make_move(move)
+        return encode(board)
+
+    end = len(played)
+    for target in (0, 1, 7, 8, 9, 23, end - 1, end):
+        assert encode(log.position(target)) == replayed(target)
+        # Backwards through the undo stack and forwards from a checkpoint
+        assert encode(log.seek(log.position(end), end, target)) == replayed(target)
+        assert encode(log.seek(log.position(0), 0, target)) == replayed(target)
+
+    log.truncate(20)
+    assert len(log) == 20
+    assert encode(log.position(20)) == replayed(20)
+    board = log.position(20)
+    rng = random.Random(3)
+    for _ in range(15):
+        move = rng.choice(board.generate_legal_moves(board.current_turn))
+        captured = board.board[move[2]][move[3]]
+        board.make_move(move)
+        log.append(board, move, captured)
+    assert encode(log.position(len(log))) == encode(board)
+    restored = MoveLog.from_dict(json.loads(json.dumps(log.to_dict())))
+    assert encode(restored.position(len(restored))) == encode(board)
+    assert [restored.captured(ply) for ply in range(len(log))] == [log.captured(ply) for ply in range(len(log))]
@@ -0,0 +1,35 @@
+import pytest
+
+from board import Board
+from pgn import read_games, san_to_move
+from pgn_stats import replay
+
+GAMES = '''[Event "One"]
+
+1. e4 !? e5 2. Nf3 + Nc6 $1 3. Bb5 {Spanish} a6 1-0
+
+[Event "Two"]
+
+1. d4 d5 2. c4 ! (2. Nf3 ?) e6 0-1
+'''
+
+
+def test_standalone_annotations_are_skipped():
+    games = list(read_games(GAMES.splitlines()))
+    assert [game['moves'] for game in games] == [
+        ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6'],
+        ['d4', 'd5', 'c4', 'e6'],
+    ]
+    assert [game['result'] for game in games] == ['1-0', '0-1']
+    for game in games:
+        plies, _, _, truncated = replay(game['moves'])
+        assert plies == len(game['moves'])
+        assert truncated is None
+
+
+@pytest.mark.parametrize('san', ['!?', '+', '#', ''])
+def test_annotation_only_san_is_a_value_error(san):
+    board = Board()
+    board.setup_pieces()
+    with pytest.raises(ValueError):
+        san_to_move(board, san)
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from codec import decode
+from server import GameServer, RequestError
+
+
+def test_flush_during_cpu_reply_saves_the_reply(tmp_path):
+    async def play():
+        server = GameServer(workers=1, think_time=0.5, store_path=str(tmp_path / 'sessions.db'),
+                            flush_interval=0.1, book_path='missing', tablebase_dir='missing')
+        await server.start(port=0)
+        try:
+            session_id = server.new_session()['session']
+            response = await server.play(session_id, 'e2e4')
+            assert response['move']
+            await asyncio.sleep(0.3)
+            return server.store.load(session_id)
+        finally:
+            await server.close()
+
+    position, plies, result = asyncio.run(play())
+    assert plies == 2
+    assert decode(position).current_turn == 'white'
+    assert result is None
+
+
+def test_end_waits_for_the_cpu_reply(tmp_path):
+    async def play():
+        server = GameServer(workers=1, think_time=0.5, store_path=str(tmp_path / 'sessions.db'),
+                            flush_interval=60, book_path='missing', tablebase_dir='missing')
+        await server.start(port=0)
+        try:
+            session_id = server.new_session()['session']
+            move = asyncio.ensure_future(server.play(session_id, 'e2e4'))
+            await asyncio.sleep(0.1)
+            with pytest.raises(RequestError):
+                await server.end_session(session_id)
+            await move
+            assert await server.end_session(session_id) == {'ended': session_id}
+            return server.store.load(session_id)
+        finally:
+            await server.close()
+    position, plies, result = asyncio.run(play())
+    assert plies == 2
+    assert decode(position).current_turn == 'white'
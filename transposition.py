@@ -0,0 +1,76 @@
+from array import array
+
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# Bytes per entry: one 64-bit key plus one packed 64-bit data word
+ENTRY_SIZE = 16
+SCORE_OFFSET = 1 << 31
+
+
+def encode_move(move):
+    # 12 bits for from/to squares plus a presence bit
+    if move is None:
+        return 0
+    start_x, start_y, end_x, end_y = move
+    return 1 << 12 | (start_x * 8 + start_y) << 6 | (end_x * 8 + end_y)
+
+
+def decode_move(code):
+    if not code:
+        return None
+    start, end = (code >> 6) & 63, code & 63
+    return (start // 8, start % 8, end // 8, end % 8)
+
+
+class TranspositionTable:
+    def __init__(self, size_mb=16):
+        # Round down to a power of two so the index is a mask of the hash
+        entries = max(1, (size_mb * 1024 * 1024) // ENTRY_SIZE)
+        self.size = 1 << (entries.bit_length() - 1)
+        self.mask = self.size - 1
+        self.keys = array('Q', bytes(8 * self.size))
+        self.data = array('Q', bytes(8 * self.size))
+        self.generation = 0
+
+    def new_search(self):
+        # Entries from older searches are the first to be overwritten
+        self.generation = (self.generation + 1) & 255
+
+    def clear(self):
+        self.keys = array('Q', bytes(8 * self.size))
+        self.data = array('Q', bytes(8 * self.size))
+        self.generation = 0
+
+    def probe(self, key):
+        # Returns (depth, score, flag, move) or None
+        index = key & self.mask
+        if self.keys[index] != key:
+            return None
+        data = self.data[index]
+        if not data:
+            return None
+        score = (data & 0xFFFFFFFF) - SCORE_OFFSET
+        depth = (data >> 32) & 255
+        flag = (data >> 40) & 3
+        return depth, score, flag, decode_move(data >> 50)
+
+    def store(self, key, depth, score, flag, move):
+        index = key & self.mask
+        data = self.data[index]
+        if data and self.keys[index] != key:
+            # Depth-preferred replacement, but never keep stale entries over fresh ones
+            stored_generation = (data >> 42) & 255
+            if stored_generation == self.generation and (data >> 32) & 255 > depth:
+                return
+        self.keys[index] = key
+        self.data[index] = ((score + SCORE_OFFSET) | min(depth, 255) << 32 | flag << 40 |
+                            self.generation << 42 | encode_move(move) << 50)
+
+    def usage(self):
+        # Permille of the first 1000 slots filled in the current generation, like UCI hashfull
+        sample = min(1000, self.size)
+        used = sum(1 for i in range(sample)
+                   if self.data[i] and (self.data[i] >> 42) & 255 == self.generation)
+        return used * 1000 // sample
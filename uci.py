@@ -0,0 +1,237 @@
+import sys
+import threading
+
+from board import Board, move_to_uci, uci_to_move
+from book import OpeningBook
+from codec import from_fen
+from engine import choose_move
+from pieces import PAWN
+from search import Searcher, MATE_SCORE
+from tablebase import Tablebases
+
+# UCI front end for the CPU player, for GUIs, tournament managers and
+# scripted analysis: python uci.py. The search runs on a background thread
+# so stop and isready are answered while it thinks. Castling, en passant and
+# under-promotion do not exist in this ruleset; a position whose move list
+# uses them is played out up to that move.
+
+NAME = 'Pygame Chess'
+AUTHOR = 'Pygame Chess contributors'
+# Clock moves assumed left when the GUI sends no movestogo
+MOVES_TO_GO = 30
+# Seconds kept in hand per move for I/O and thread start-up
+OVERHEAD = 0.05
+
+
+def format_move(board, move):
+    # Promotions always make a queen, which UCI spells out
+    start_x, start_y, end_x, _ = move
+    piece = board.board[start_x][start_y]
+    suffix = 'q' if piece and piece.kind == PAWN and end_x in (0, 7) else ''
+    return move_to_uci(move) + suffix
+
+
+def format_score(score):
+    # Mate scores are MATE_SCORE minus the plies to mate
+    if abs(score) >= MATE_SCORE - 1000:
+        plies = MATE_SCORE - abs(score)
+        return f"mate {(plies + 1) // 2 if score > 0 else -((plies + 1) // 2)}"
+    return f"cp {score}"
+
+
+class UCIEngine:
+    """Reads UCI commands and answers on output; one search at a time."""
+
+    def __init__(self, output=sys.stdout, book_path='book.bin', tablebase_dir='tablebases'):
+        self.output = output
+        # Both threads write, so every line goes out whole
+        self.output_lock = threading.Lock()
+        self.hash_mb = 16
+        self.threads = 1
+        self.own_book = True
+        self.searcher = Searcher(tt_size_mb=self.hash_mb)
+        self.parallel = None
+        self.book = OpeningBook.open(book_path)
+        self.tablebases = Tablebases.open(tablebase_dir)
+        self.board = Board()
+        self.board.setup_pieces()
+        self.search_thread = None
+        # The running search's searcher and root position
+        self.active = None
+        self.root = None
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    def run(self, lines=sys.stdin):
+        for line in lines:
+            if not self.handle(line):
+                break
+        self.stop()
+        self.close()
+
+    def handle(self, line):
+        # Returns False on quit
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == 'uci':
+            self.send(f"id name {NAME}")
+            self.send(f"id author {AUTHOR}")
+            self.send('option name Hash type spin default 16 min 1 max 1024')
+            self.send('option name Threads type spin default 1 min 1 max 64')
+            self.send('option name OwnBook type check default true')
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'setoption':
+            self.set_option(args)
+        elif command == 'ucinewgame':
+            self.stop()
+            # Drop the transposition table so games do not leak into each other
+            self.searcher.tt = None
+        elif command == 'position':
+            self.stop()
+            self.set_position(args)
+        elif command == 'go':
+            self.stop()
+            self.go(args)
+        elif command == 'stop':
+            self.stop()
+        elif command == 'quit':
+            return False
+        return True
+
+    def set_option(self, args):
+        # setoption name <name> value <value>
+        if 'name' not in args:
+            return
+        text = ' '.join(args[args.index('name') + 1:])
+        name, _, value = text.partition(' value ')
+        name = name.strip().lower()
+        self.stop()
+        if name == 'hash':
+            self.hash_mb = max(1, int(value))
+            self.searcher = Searcher(tt_size_mb=self.hash_mb)
+            # Workers size their tables when they start, so the pool starts over
+            self.start_parallel()
+        elif name == 'threads':
+            self.threads = max(1, int(value))
+            self.start_parallel()
+        elif name == 'ownbook':
+            self.own_book = value.strip().lower() == 'true'
+        else:
+            self.send(f"info string unknown option {name}")
+
+    def start_parallel(self):
+        # (Re)starts the process pool for the current Threads and Hash values
+        if self.parallel:
+            self.parallel.shutdown()
+            self.parallel = None
+        if self.threads > 1:
+            # Forked here, between reads: a worker forked while the main
+            # thread sits in a stdin read deadlocks closing its copy of stdin
+            from parallel import ParallelSearcher
+            self.parallel = ParallelSearcher(workers=self.threads, tt_size_mb=self.hash_mb)
+            self.parallel.start()
+
+    def set_position(self, args):
+        # position (startpos | fen <six fields>) [moves <move> ...]
+        moves = args.index('moves') if 'moves' in args else len(args)
+        if args and args[0] == 'fen':
+            board = from_fen(' '.join(args[1:moves]))
+        else:
+            board = Board()
+            board.setup_pieces()
+        for text in args[moves + 1:]:
+            try:
+                move = uci_to_move(text)
+            except (ValueError, IndexError):
+                move = None
+            if move is None or not board.move_piece(*move):
+                self.send(f"info string illegal move {text}, position ends before it")
+                break
+        self.board = board
+
+    def go(self, args):
+        limits = {}
+        for i, token in enumerate(args[:-1]):
+            if token in ('depth', 'nodes', 'movetime', 'wtime', 'btime', 'winc', 'binc', 'movestogo'):
+                limits[token] = int(args[i + 1])
+        self.active = self._searcher(limits)
+        self.root = self.board
+        self.search_thread = threading.Thread(target=self._search, args=(self.active, self.root),
+                                              daemon=True)
+        self.search_thread.start()
+
+    def _searcher(self, limits):
+        # A searcher configured for the go limits; none of them means infinite
+        time_limit = None
+        if 'movetime' in limits:
+            time_limit = max(limits['movetime'] / 1000 - OVERHEAD, 0.01)
+        elif 'wtime' in limits or 'btime' in limits:
+            side = 'w' if self.board.current_turn == 'white' else 'b'
+            remaining = limits.get(side + 'time', 0) / 1000
+            increment = limits.get(side + 'inc', 0) / 1000
+            budget = remaining / limits.get('movestogo', MOVES_TO_GO) + increment / 2
+            time_limit = max(min(budget, remaining / 2) - OVERHEAD, 0.01)
+        max_nodes = limits.get('nodes')
+
+        # The process pool cannot be interrupted or held to a depth, so it
+        # only takes searches with a time or node budget
+        if self.parallel and 'depth' not in limits and (time_limit or max_nodes):
+            self.parallel.time_limit = time_limit
+            self.parallel.max_nodes = max_nodes
+            return self.parallel
+        searcher = self.searcher
+        searcher.time_limit = time_limit
+        searcher.max_nodes = max_nodes
+        searcher.depth_limit = limits.get('depth')
+        searcher.report = self.report
+        return searcher
+
+    def report(self, searcher):
+        # info line for every finished iteration
+        stats = searcher.stats()
+        hashfull = f" hashfull {stats['hashfull']}" if 'hashfull' in stats else ''
+        self.send(f"info depth {stats['depth']} score {format_score(stats['score'])} "
+                  f"nodes {stats['nodes']} nps {stats['nps']} time {int(stats['time'] * 1000)}{hashfull} "
+                  f"pv {format_move(self.root, searcher.best_move)}")
+
+    def _search(self, searcher, board):
+        book = self.book if self.own_book else None
+        move = choose_move(board, searcher, book, self.tablebases)
+        if searcher is self.parallel:
+            # A stopped pool search returns None but still knows the best
+            # move its workers found; it reports once, at the end
+            move = move or searcher.best_move
+            if move and move == searcher.best_move:
+                self.report(searcher)
+        self.send(f"bestmove {format_move(board, move) if move else '0000'}")
+
+    def stop(self):
+        # Ends any running search; its bestmove is sent before this returns.
+        # Keep asking in case the thread had not entered the search yet
+        while self.search_thread and self.search_thread.is_alive():
+            self.active.stop()
+            self.search_thread.join(0.005)
+        self.search_thread = None
+
+    def close(self):
+        if self.parallel:
+            self.parallel.shutdown()
+        if self.book:
+            self.book.close()
+        if self.tablebases:
+            self.tablebases.close()
+
+
+def main():
+    UCIEngine().run()
+
+
+if __name__ == '__main__':
+    main()
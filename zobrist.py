@@ -0,0 +1,19 @@
+import random
+
+# Fixed seed so hashes are stable across processes and runs
+_rng = random.Random(2024)
+
+# Indexed by piece.code, then square (row * 8 + col)
+PIECE_KEYS = [[_rng.getrandbits(64) for _ in range(64)] for _ in range(12)]
+BLACK_TO_MOVE = _rng.getrandbits(64)
+
+
+def compute_hash(board):
+    # Full recomputation; Board keeps board.hash current incrementally
+    h = BLACK_TO_MOVE if board.current_turn == 'black' else 0
+    for row in range(8):
+        for col in range(8):
+            piece = board.board[row][col]
+            if piece:
+                h ^= PIECE_KEYS[piece.code][row * 8 + col]
+    return h